@@ -0,0 +1,170 @@
+import asyncio
+import contextlib
+import json
+import time
+from typing import Dict, Any, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from sse_starlette.sse import EventSourceResponse
+
+from schema_compiler import schema_compiler
+
+
+class UserSession:
+    """Chat session and in-flight query bookkeeping for one API user"""
+
+    def __init__(self, chat):
+        self.chat = chat
+        # Queries on one chat must run one at a time or its history gets interleaved
+        self.lock = asyncio.Lock()
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+
+
+class QueryResponse(EventSourceResponse):
+    """SSE response of a query that releases the user's query slot however it ends,
+    including when its body never starts because the client is already gone"""
+
+    def __init__(self, content, session: UserSession):
+        super().__init__(content)
+        self.session = session
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.session.in_flight -= 1
+            self.session.last_used = time.monotonic()
+
+
+class APIServer:
+    """HTTP/SSE front-end serving many users from one MCPHost.
+
+    All users share the host's MCP server connections. Each user gets a chat
+    session that persists across their queries; queries stream their progress
+    events back over SSE.
+
+    Settings come from the "api" section of config.json:
+    - maxConcurrentQueries: queries running at once across all users (default 64)
+    - maxQueriesPerUser: queries a user may have running or waiting (default 2)
+    - sessionIdleTimeout: seconds before an idle user's chat session is dropped (default 3600)
+    """
+
+    def __init__(self, host, settings: Optional[Dict[str, Any]] = None):
+        self.host = host
+        settings = settings or {}
+        self.max_queries_per_user = int(settings.get('maxQueriesPerUser', 2))
+        self.session_idle_timeout = float(settings.get('sessionIdleTimeout', 3600))
+        self.query_semaphore = asyncio.Semaphore(int(settings.get('maxConcurrentQueries', 64)))
+        self.sessions: Dict[str, UserSession] = {}
+        self.stats = {"queries": 0, "running": 0, "rejected": 0, "errors": 0}
+
+    def _expire_sessions(self) -> None:
+        """Drop chat sessions of users that have been idle too long"""
+        now = time.monotonic()
+        for user, session in list(self.sessions.items()):
+            if session.in_flight == 0 and now - session.last_used > self.session_idle_timeout:
+                del self.sessions[user]
+
+    def get_session(self, user: str) -> UserSession:
+        """Get or create the chat session of a user"""
+        self._expire_sessions()
+        session = self.sessions.get(user)
+        if session is None:
+            session = UserSession(self.host.model.start_chat(history=[]))
+            self.sessions[user] = session
+        session.last_used = time.monotonic()
+        return session
+
+    async def _stream_query(self, user: str, session: UserSession, query: str):
+        """Run a query for a user and yield its events as SSE messages"""
+        try:
+            yield {"event": "queued", "data": json.dumps({"user": user})}
+            async with session.lock, self.query_semaphore:
+                self.stats["running"] += 1
+                start_time = time.perf_counter()
+                try:
+                    # Closed as soon as the client disconnects, so the query stops with it
+                    async with contextlib.aclosing(self.host.process_query_events(query, session.chat)) as events:
+                        async for event in events:
+                            if event["type"] == "final":
+                                event = {**event, "seconds": time.perf_counter() - start_time}
+                            yield {"event": event["type"], "data": json.dumps(event, default=str)}
+                finally:
+                    self.stats["running"] -= 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            yield {"event": "error", "data": json.dumps({"error": str(e)})}
+
+    async def handle_query(self, request: Request):
+        """POST /query {"user": ..., "query": ...} -> SSE stream of query events"""
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            return JSONResponse({"error": "Body must be JSON"}, status_code=400)
+        user = str(body.get("user") or "anonymous")
+        query = str(body.get("query") or "").strip()
+        if not query:
+            return JSONResponse({"error": "Missing 'query'"}, status_code=400)
+
+        session = self.get_session(user)
+        if session.in_flight >= self.max_queries_per_user:
+            self.stats["rejected"] += 1
+            return JSONResponse({"error": f"User '{user}' already has {session.in_flight} queries in flight"},
+                                status_code=429)
+        # Released by the response when it ends
+        session.in_flight += 1
+        self.stats["queries"] += 1
+        return QueryResponse(self._stream_query(user, session, query), session)
+
+    async def handle_reset(self, request: Request):
+        """DELETE /sessions/{user} -> forget a user's chat history"""
+        user = request.path_params["user"]
+        session = self.sessions.get(user)
+        if session and session.in_flight:
+            return JSONResponse({"error": "Session has queries in flight"}, status_code=409)
+        self.sessions.pop(user, None)
+        return JSONResponse({"user": user, "reset": True})
+
+    async def handle_health(self, request: Request):
+        """GET /health -> connected servers, tools, caches, session pools, circuit breakers, tool latency and load counters"""
+        return JSONResponse({
+            "servers": {name: bool(client.session) for name, client in self.host.mcp_clients.items()},
+            "tools": len(self.host.tool_routes),
+            "sessions": len(self.sessions),
+            "toolCache": self.host.tool_cache.summary(),
+            "schemaCache": schema_compiler.summary(),
+            "sessionPools": {name: client.pool.summary() for name, client in self.host.mcp_clients.items()},
+            "circuits": {name: client.breaker.summary() for name, client in self.host.mcp_clients.items()},
+            "toolLatency": {name: client.call_stats() for name, client in self.host.mcp_clients.items()},
+            **self.stats,
+        })
+
+    async def handle_logs(self, request: Request):
+        """GET /servers/{name}/logs?lines=N[&follow=1] -> recent server output, or an SSE stream of it"""
+        client = self.host.mcp_clients.get(request.path_params["name"])
+        if client is None:
+            return JSONResponse({"error": "Unknown server"}, status_code=404)
+        try:
+            lines = int(request.query_params.get("lines", 100))
+        except ValueError:
+            return JSONResponse({"error": "'lines' must be a number"}, status_code=400)
+        if request.query_params.get("follow") in ("1", "true"):
+            async def _follow():
+                async for line in client.output.follow(backlog=lines):
+                    yield {"event": "line", "data": line}
+            return EventSourceResponse(_follow())
+        return JSONResponse({"server": client.server_name, "total": client.output.total_lines,
+                             "lines": client.output.tail(lines)})
+
+    def create_app(self) -> Starlette:
+        """Create the Starlette application for this API"""
+        return Starlette(routes=[
+            Route("/query", endpoint=self.handle_query, methods=["POST"]),
+            Route("/sessions/{user}", endpoint=self.handle_reset, methods=["DELETE"]),
+            Route("/health", endpoint=self.handle_health, methods=["GET"]),
+            Route("/servers/{name}/logs", endpoint=self.handle_logs, methods=["GET"]),
+        ])
@@ -0,0 +1,221 @@
+"""Offline end-to-end benchmark of the host with a scripted LLM and local stub servers.
+
+Starts the servers from a config file (templateServer plus stubServer.py
+instances with configurable latency), swaps Gemini for StubModel and measures:
+
+- startup: time until every server is connected and its tools are loaded
+- tool_overhead: host._call_tool against a direct session.call_tool of the same tool
+- query_latency: queries run one after another (p50/p95/p99)
+- throughput: many queries at once, bounded by --concurrency
+
+    python benchmarks/bench_host.py --output before.json
+    python benchmarks/bench_host.py --output after.json --compare before.json
+
+The tool calls each query makes come from the "benchmark" section of the config.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from host import MCPHost  # noqa: E402
+from loadtest import percentile  # noqa: E402
+from stub_llm import StubModel  # noqa: E402
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """Percentiles of a list of durations, in milliseconds"""
+    return {
+        "count": len(seconds),
+        "mean_ms": 1000 * sum(seconds) / len(seconds) if seconds else 0.0,
+        "p50_ms": 1000 * percentile(seconds, 50),
+        "p95_ms": 1000 * percentile(seconds, 95),
+        "p99_ms": 1000 * percentile(seconds, 99),
+        "max_ms": 1000 * max(seconds) if seconds else 0.0,
+    }
+
+
+def git_commit() -> str:
+    """Short hash of the checked out commit, marked dirty if there are local changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def bench_startup(host: MCPHost, servers: Dict[str, Any]) -> Dict[str, Any]:
+    """Start every configured server and load the tools"""
+    start_time = time.perf_counter()
+    await host.start_all_servers(servers)
+    await host.load_all_tools()
+    return {
+        "total_ms": 1000 * (time.perf_counter() - start_time),
+        "servers": {
+            name: {"status": report["status"], "ms": 1000 * (report["seconds"] or 0.0),
+                   "ready_ms": 1000 * (report["ready"] or 0.0), "tools": report["tools"]}
+            for name, report in host.startup_report.items()
+        },
+    }
+
+
+async def bench_tool_overhead(host: MCPHost, tool_calls: List[Tuple[str, Dict[str, Any]]],
+                              calls: int) -> Dict[str, Any]:
+    """Time each tool directly on its session and through the host, alternating the two"""
+    results = {}
+    for tool_name, tool_args in tool_calls:
+        client = host.get_client_for_tool(tool_name)
+        if not client:
+            continue
+        direct, routed = [], []
+        for _ in range(calls):
+            start_time = time.perf_counter()
+            await client.session.call_tool(tool_name, tool_args)
+            direct.append(time.perf_counter() - start_time)
+            start_time = time.perf_counter()
+            await host._call_tool(tool_name, tool_args)
+            routed.append(time.perf_counter() - start_time)
+        direct_summary = latency_summary(direct)
+        routed_summary = latency_summary(routed)
+        results[tool_name] = {
+            "direct": direct_summary,
+            "host": routed_summary,
+            "overhead_p50_ms": routed_summary["p50_ms"] - direct_summary["p50_ms"],
+            "overhead_mean_ms": routed_summary["mean_ms"] - direct_summary["mean_ms"],
+        }
+    return results
+
+
+async def run_query(host: MCPHost, query: str) -> Tuple[bool, float]:
+    """Run one query through the event stream, as the chat loop and API do"""
+    start_time = time.perf_counter()
+    ok = False
+    try:
+        async for event in host.process_query_events(query):
+            if event["type"] == "final":
+                ok = True
+    except Exception as e:
+        print(f"Query failed: {e}")
+    return ok, time.perf_counter() - start_time
+
+
+async def bench_query_latency(host: MCPHost, queries: int) -> Dict[str, Any]:
+    """Queries one after another"""
+    results = [await run_query(host, f"benchmark query {i}") for i in range(queries)]
+    return {"failed": sum(1 for ok, _ in results if not ok),
+            **latency_summary([seconds for ok, seconds in results if ok])}
+
+
+async def bench_throughput(host: MCPHost, queries: int, concurrency: int) -> Dict[str, Any]:
+    """Many queries at once, at most concurrency in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _bounded(i):
+        async with semaphore:
+            return await run_query(host, f"concurrent query {i}")
+
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*(_bounded(i) for i in range(queries)))
+    elapsed = time.perf_counter() - start_time
+    ok = [seconds for succeeded, seconds in results if succeeded]
+    return {
+        "concurrency": concurrency,
+        "failed": len(results) - len(ok),
+        "elapsed_s": elapsed,
+        "queries_per_second": len(ok) / elapsed if elapsed else 0.0,
+        **latency_summary(ok),
+    }
+
+
+def flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    """Numeric leaves of a nested result as dotted keys"""
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def print_comparison(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Print every metric next to the baseline run with the relative change"""
+    before = flatten({k: v for k, v in baseline.items() if k != "meta"})
+    after = flatten({k: v for k, v in current.items() if k != "meta"})
+    print(f"\nCompared with {baseline.get('meta', {}).get('commit', 'baseline')}:")
+    width = max([len(key) for key in after] + [6])
+    for key, value in after.items():
+        if key not in before:
+            continue
+        old = before[key]
+        change = f"{100 * (value - old) / old:+.1f}%" if old else "-"
+        print(f"{key.ljust(width)}  {old:>12.3f}  {value:>12.3f}  {change:>8}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the MCP host')
+    parser.add_argument('--config', default=os.path.join(ROOT, 'benchmarks', 'bench_config.json'))
+    parser.add_argument('--queries', type=int, default=50, help='Queries for the sequential latency run')
+    parser.add_argument('--concurrent-queries', type=int, default=200, help='Queries for the throughput run')
+    parser.add_argument('--concurrency', type=int, default=32, help='Queries in flight during the throughput run')
+    parser.add_argument('--overhead-calls', type=int, default=50, help='Calls per tool for the overhead run')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Seconds per stub LLM call')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    parser.add_argument('--verbose', action='store_true', help='Show host logs')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    host = MCPHost(args.config)
+    servers = host.load_server_config()
+    tool_calls = [tuple(call) for call in host.host_settings.get('benchmark', {}).get('toolCalls', [])]
+    host.model = StubModel(tool_calls=tool_calls, latency=args.llm_latency)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": os.path.relpath(args.config, ROOT),
+            "servers": list(servers),
+            "args": vars(args),
+        }
+    }
+    with quiet:
+        try:
+            results["startup"] = await bench_startup(host, servers)
+            results["tool_overhead"] = await bench_tool_overhead(host, tool_calls, args.overhead_calls)
+            results["query_latency"] = await bench_query_latency(host, args.queries)
+            results["throughput"] = await bench_throughput(host, args.concurrent_queries, args.concurrency)
+        finally:
+            await host.shutdown()
+
+    print(json.dumps({k: v for k, v in results.items() if k != "meta"}, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,343 @@
+"""Cost of turning tool input schemas into Gemini function declarations.
+
+Normalizes a few large, deeply nested schemas of the kind real servers
+publish (pydantic models with $defs, recursive definitions, Optional and
+Literal fields) plus generated ones, with the recursive cleaner MCPClient
+used before and with SchemaCompiler, cold (empty cache) and warm:
+
+    python benchmarks/bench_schemas.py --runs 200 --output schemas.json
+    python benchmarks/bench_schemas.py --compare schemas.json
+
+The old cleaner dropped $refs instead of inlining them, so its output is
+smaller and its times are a lower bound for the same work.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Dict, Any, List, Literal, Optional, Union
+
+from pydantic import BaseModel, Field
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from schema_compiler import SchemaCompiler  # noqa: E402
+from bench_host import latency_summary, git_commit, print_comparison  # noqa: E402
+
+
+def legacy_clean_json_schema(schema):
+    """MCPClient._clean_json_schema as it was before SchemaCompiler, for comparison"""
+    unsupported_fields = [
+        "anyOf", "allOf", "oneOf", "not", "$ref",
+        "additionalProperties", "patternProperties", "propertyNames",
+        "dependencies", "if", "then", "else", "default",
+        "const", "enum", "format", "contentEncoding", "contentMediaType",
+        "examples", "title", "definitions", "$schema", "$id",
+        "uniqueItems", "contains", "multipleOf", "exclusiveMinimum",
+        "exclusiveMaximum", "pattern"
+    ]
+    if not isinstance(schema, dict):
+        return schema
+    cleaned = {}
+    for key, value in schema.items():
+        if key in unsupported_fields:
+            if key in ["anyOf", "oneOf"] and isinstance(value, list) and value:
+                first_option = value[0]
+                if isinstance(first_option, dict):
+                    for sub_key, sub_value in first_option.items():
+                        if sub_key not in cleaned:
+                            cleaned[sub_key] = legacy_clean_json_schema(sub_value)
+            elif key == "allOf" and isinstance(value, list):
+                for sub_schema in value:
+                    if isinstance(sub_schema, dict):
+                        for sub_key, sub_value in sub_schema.items():
+                            if sub_key not in cleaned:
+                                cleaned[sub_key] = legacy_clean_json_schema(sub_value)
+            elif key == "enum" and isinstance(value, list):
+                if "description" not in cleaned:
+                    cleaned["description"] = f"Allowed values: {', '.join([str(v) for v in value])}"
+            elif key == "title" and isinstance(value, str):
+                cleaned["description"] = f"{value}: {cleaned['description']}" if "description" in cleaned else value
+            continue
+        elif isinstance(value, dict):
+            cleaned[key] = legacy_clean_json_schema(value)
+        elif isinstance(value, list):
+            cleaned[key] = [legacy_clean_json_schema(item) if isinstance(item, dict) else item for item in value]
+        else:
+            cleaned[key] = value
+    return cleaned
+
+
+# A GitHub-style issue tool, the kind of schema an API wrapper server publishes
+
+class IssueState(str, Enum):
+    open = "open"
+    closed = "closed"
+
+
+class User(BaseModel):
+    login: str
+    id: int
+    site_admin: bool = False
+    email: Optional[str] = Field(None, description="Public email, if any")
+
+
+class Label(BaseModel):
+    name: str
+    color: str = Field(..., pattern="^[0-9a-f]{6}$")
+    description: Optional[str] = None
+
+
+class Milestone(BaseModel):
+    title: str
+    state: IssueState = IssueState.open
+    due_on: Optional[str] = Field(None, json_schema_extra={"format": "date-time"})
+    creator: Optional[User] = None
+
+
+class Reactions(BaseModel):
+    plus_one: int = 0
+    minus_one: int = 0
+    laugh: int = 0
+    heart: int = 0
+
+
+class Issue(BaseModel):
+    repository: str = Field(..., description="owner/name")
+    title: str
+    body: Optional[str] = None
+    state: IssueState = IssueState.open
+    labels: List[Union[Label, str]] = []
+    assignees: List[User] = []
+    author: User
+    milestone: Optional[Milestone] = None
+    reactions: Optional[Reactions] = None
+    state_reason: Optional[Literal["completed", "not_planned", "reopened"]] = None
+
+
+# A Kubernetes-style deployment tool: deep nesting with definitions shared across branches
+
+class EnvVarSource(BaseModel):
+    secret_name: Optional[str] = None
+    config_map_name: Optional[str] = None
+    key: str
+
+
+class EnvVar(BaseModel):
+    name: str
+    value: Optional[str] = None
+    value_from: Optional[EnvVarSource] = None
+
+
+class Quantity(BaseModel):
+    cpu: Optional[str] = None
+    memory: Optional[str] = None
+
+
+class Resources(BaseModel):
+    limits: Optional[Quantity] = None
+    requests: Optional[Quantity] = None
+
+
+class HttpGet(BaseModel):
+    path: str
+    port: int
+    scheme: Literal["HTTP", "HTTPS"] = "HTTP"
+
+
+class Probe(BaseModel):
+    http_get: Optional[HttpGet] = None
+    exec_command: Optional[List[str]] = None
+    initial_delay_seconds: int = 0
+    period_seconds: int = 10
+
+
+class ContainerPort(BaseModel):
+    container_port: int
+    protocol: Literal["TCP", "UDP", "SCTP"] = "TCP"
+    name: Optional[str] = None
+
+
+class VolumeMount(BaseModel):
+    name: str
+    mount_path: str
+    read_only: bool = False
+
+
+class Container(BaseModel):
+    name: str
+    image: str
+    command: Optional[List[str]] = None
+    env: List[EnvVar] = []
+    ports: List[ContainerPort] = []
+    resources: Optional[Resources] = None
+    liveness_probe: Optional[Probe] = None
+    readiness_probe: Optional[Probe] = None
+    volume_mounts: List[VolumeMount] = []
+
+
+class SecretVolume(BaseModel):
+    secret_name: str
+
+
+class ConfigMapVolume(BaseModel):
+    name: str
+    items: List[Dict[str, str]] = []
+
+
+class Volume(BaseModel):
+    name: str
+    source: Union[SecretVolume, ConfigMapVolume]
+
+
+class PodSpec(BaseModel):
+    containers: List[Container]
+    init_containers: List[Container] = []
+    volumes: List[Volume] = []
+    node_selector: Dict[str, str] = {}
+
+
+class PodTemplate(BaseModel):
+    labels: Dict[str, str] = {}
+    spec: PodSpec
+
+
+class DeploymentSpec(BaseModel):
+    replicas: int = 1
+    selector: Dict[str, str]
+    template: PodTemplate
+    strategy: Literal["RollingUpdate", "Recreate"] = "RollingUpdate"
+
+
+class Deployment(BaseModel):
+    namespace: str = "default"
+    name: str
+    spec: DeploymentSpec
+    dry_run: bool = False
+
+
+# A recursive comment thread, as a forum or document server would publish
+
+class Comment(BaseModel):
+    author: User
+    text: str
+    replies: List["Comment"] = []
+    parent: Optional["Comment"] = None
+
+
+class Thread(BaseModel):
+    subject: str
+    comments: List[Comment]
+
+
+def generated_schema(depth: int, breadth: int) -> Dict[str, Any]:
+    """Objects nested depth levels deep with breadth properties each, using most supported keywords"""
+    def level(remaining: int) -> Dict[str, Any]:
+        if remaining == 0:
+            return {"type": "string", "title": "Leaf", "enum": ["a", "b", "c"], "default": "a"}
+        properties = {f"field_{i}": level(remaining - 1) for i in range(breadth)}
+        properties["maybe"] = {"anyOf": [{"type": "integer", "minimum": 0}, {"type": "null"}], "default": None}
+        return {"type": "object", "title": f"Level{remaining}", "properties": properties,
+                "required": [f"field_{i}" for i in range(breadth)], "additionalProperties": False}
+    return level(depth)
+
+
+def chain_schema(depth: int) -> Dict[str, Any]:
+    """One object nested depth levels deep, past what a recursive cleaner can handle"""
+    schema: Dict[str, Any] = {"type": "string"}
+    for i in range(depth):
+        schema = {"type": "object", "properties": {f"level_{i}": schema}}
+    return schema
+
+
+def build_schemas(args) -> Dict[str, Dict[str, Any]]:
+    return {
+        "github_issue": Issue.model_json_schema(),
+        "k8s_deployment": Deployment.model_json_schema(),
+        "comment_thread": Thread.model_json_schema(),
+        f"generated_{args.depth}x{args.breadth}": generated_schema(args.depth, args.breadth),
+        f"chain_{args.chain_depth}": chain_schema(args.chain_depth),
+    }
+
+
+def time_runs(function, schema: Dict[str, Any], runs: int) -> List[float]:
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        function(schema)
+        durations.append(time.perf_counter() - start_time)
+    return durations
+
+
+def bench_schema(schema: Dict[str, Any], runs: int) -> Dict[str, Any]:
+    """Old cleaner, compiler with an empty cache and compiler with the schema cached"""
+    results: Dict[str, Any] = {"input_bytes": len(json.dumps(schema))}
+    try:
+        results["legacy"] = latency_summary(time_runs(legacy_clean_json_schema, schema, runs))
+        results["legacy_output_bytes"] = len(json.dumps(legacy_clean_json_schema(schema)))
+    except RecursionError:
+        results["legacy_error"] = "RecursionError"
+
+    compiler = SchemaCompiler()
+
+    def cold(schema):
+        compiler.clear()
+        return compiler.normalize(schema)
+
+    results["cold"] = latency_summary(time_runs(cold, schema, runs))
+    results["warm"] = latency_summary(time_runs(compiler.normalize, schema, runs))
+    results["output_bytes"] = len(json.dumps(compiler.normalize(schema)))
+    return results
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    print(f"\n{'schema':<20} {'input B':>9} {'legacy p50 ms':>14} {'cold p50 ms':>12} {'warm p50 ms':>12} {'output B':>9}")
+    for name, result in results.items():
+        if name == "meta":
+            continue
+        legacy = f"{result['legacy']['p50_ms']:.3f}" if "legacy" in result else result.get("legacy_error", "-")
+        print(f"{name:<20} {result['input_bytes']:>9} {legacy:>14} {result['cold']['p50_ms']:>12.3f} "
+              f"{result['warm']['p50_ms']:>12.3f} {result['output_bytes']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost of normalizing tool schemas for Gemini')
+    parser.add_argument('--runs', type=int, default=100, help='Timed runs per schema and method')
+    parser.add_argument('--depth', type=int, default=6, help='Nesting depth of the generated schema')
+    parser.add_argument('--breadth', type=int, default=4, help='Properties per object of the generated schema')
+    parser.add_argument('--chain-depth', type=int, default=600, help='Nesting depth of the chain schema')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    args = parser.parse_args()
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        }
+    }
+    for name, schema in build_schemas(args).items():
+        results[name] = bench_schema(schema, args.runs)
+
+    print(json.dumps({k: v for k, v in results.items() if k != "meta"}, indent=2))
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
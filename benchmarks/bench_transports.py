@@ -0,0 +1,148 @@
+"""Per-call latency of one MCP server over each transport MCPClient supports.
+
+Starts benchmarks/stubServer.py over SSE (with a socket handed over by the
+host), over stdio, and imported in-process, then times session.call_tool for
+echo and for payload results of a few sizes on each (whole, and streamed in
+--chunk-size pieces), one call at a time and with --concurrency calls in
+flight, through a session pool of up to --max-sessions sessions:
+
+    python benchmarks/bench_transports.py --calls 500 --output transports.json
+    python benchmarks/bench_transports.py --max-sessions 8 --compare transports.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from client import MCPClient  # noqa: E402
+from bench_host import latency_summary, git_commit, print_comparison  # noqa: E402
+
+STUB_SERVER = os.path.join("benchmarks", "stubServer.py")
+
+SERVER_CONFIGS = {
+    "sse": {"command": sys.executable, "args": [STUB_SERVER], "portAllocation": "socket"},
+    "stdio": {"command": sys.executable, "args": [STUB_SERVER, "--transport", "stdio"], "transport": "stdio"},
+    "inprocess": {"transport": "inprocess", "module": STUB_SERVER, "object": "xMCP"},
+}
+
+
+async def time_calls(client: MCPClient, tool_name: str, tool_args: Dict[str, Any], calls: int,
+                     concurrency: int) -> Dict[str, Any]:
+    """Make calls tool calls with up to concurrency in flight; latency of each plus calls per second"""
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: List[float] = []
+
+    async def _one():
+        async with semaphore:
+            start_time = time.perf_counter()
+            result = await client.call_tool(tool_name, tool_args)
+            durations.append(time.perf_counter() - start_time)
+            if result.isError:
+                raise Exception(f"{tool_name} failed: {result.content}")
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*(_one() for _ in range(calls)))
+    elapsed = time.perf_counter() - start_time
+    return {**latency_summary(durations), "calls_per_s": calls / elapsed if elapsed else 0.0}
+
+
+async def bench_transport(transport: str, args) -> Dict[str, Any]:
+    """Start the stub server over one transport and time its tools"""
+    config = {**SERVER_CONFIGS[transport], "maxSessions": args.max_sessions,
+              "streamingTools": ["stream"], "maxResultChars": 0}
+    client = MCPClient(f"stub-{transport}", config)
+    start_time = time.perf_counter()
+    await client.start_server()
+    if not client.session:
+        raise Exception(f"Could not start the stub server over {transport}: {client.startup_error}")
+    results: Dict[str, Any] = {"startup_ms": 1000 * (time.perf_counter() - start_time)}
+    try:
+        cases = [("echo", "echo", {"text": "ping"})]
+        cases += [(f"payload_{size}", "payload", {"size": size}) for size in args.payload_sizes]
+        cases += [(f"stream_{size}", "stream", {"size": size, "chunk_size": args.chunk_size})
+                  for size in args.payload_sizes]
+        for case_name, tool_name, tool_args in cases:
+            # Warm up the session (and the server's code paths) before timing
+            await time_calls(client, tool_name, tool_args, args.warmup, 1)
+            results[case_name] = await time_calls(client, tool_name, tool_args, args.calls, 1)
+            if args.concurrency > 1:
+                results[f"{case_name}_concurrent"] = await time_calls(client, tool_name, tool_args, args.calls,
+                                                                      args.concurrency)
+        results["pool"] = {key: value for key, value in client.pool.summary().items() if key != "sessions"}
+    finally:
+        await client.stop_server()
+    return results
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    """p50/p99 of every case side by side for the transports"""
+    transports = [name for name in results if name != "meta"]
+    cases = [case for case in results[transports[0]] if case not in ("startup_ms", "pool")] if transports else []
+    width = max([len(case) for case in cases] + [10])
+    print("\n" + "case".ljust(width) + "".join(f"  {name + ' p50/p99 ms':>24}" for name in transports))
+    for case in cases:
+        cells = []
+        for name in transports:
+            summary = results[name].get(case, {})
+            cells.append(f"  {summary.get('p50_ms', 0):>11.3f}/{summary.get('p99_ms', 0):<12.3f}")
+        print(case.ljust(width) + "".join(cells))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Per-call latency of each MCP transport')
+    parser.add_argument('--transports', nargs='+', choices=list(SERVER_CONFIGS), default=list(SERVER_CONFIGS))
+    parser.add_argument('--calls', type=int, default=300, help='Timed calls per case')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed calls before each case')
+    parser.add_argument('--concurrency', type=int, default=16, help='Calls in flight for the concurrent cases (1 to skip them)')
+    parser.add_argument('--max-sessions', type=int, default=1,
+                        help='Session pool size per server (stdio always uses one session)')
+    parser.add_argument('--payload-sizes', type=int, nargs='*', default=[1000, 100000],
+                        help='Result sizes in characters for the payload cases')
+    parser.add_argument('--chunk-size', type=int, default=16000, help='Characters per chunk for the stream cases')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+    parser.add_argument('--verbose', action='store_true', help='Show client logs')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    if not args.verbose:
+        # httpx logs every POST of the SSE transport
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        }
+    }
+    for transport in args.transports:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+        with quiet:
+            results[transport] = await bench_transport(transport, args)
+
+    print(json.dumps({k: v for k, v in results.items() if k != "meta"}, indent=2))
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""Load test for the host's HTTP/SSE API using a stub LLM and local MCP servers.
+
+Starts the servers from a config file, swaps Gemini for StubModel, serves the
+API in-process and drives it with many concurrent simulated users.
+
+    python benchmarks/loadtest.py --users 200 --queries 5 --llm-latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from host import MCPHost  # noqa: E402
+from api import APIServer  # noqa: E402
+from stub_llm import StubModel  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_user(http: httpx.AsyncClient, url: str, user: str, queries: int, results: List[Dict[str, Any]]):
+    """Send a user's queries one after another, timing first event and final answer"""
+    for i in range(queries):
+        start_time = time.perf_counter()
+        first_event = None
+        status = "error"
+        try:
+            async with http.stream("POST", f"{url}/query", json={"user": user, "query": f"add numbers #{i}"}) as response:
+                if response.status_code != 200:
+                    status = f"http {response.status_code}"
+                else:
+                    async for line in response.aiter_lines():
+                        if first_event is None and line.startswith("event:"):
+                            first_event = time.perf_counter() - start_time
+                        if line.startswith("event: final"):
+                            status = "ok"
+                        elif line.startswith("event: error"):
+                            status = "error"
+        except httpx.HTTPError as e:
+            status = f"error: {e}"
+        results.append({"status": status, "seconds": time.perf_counter() - start_time, "first_event": first_event})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Load test the MCP host HTTP/SSE API')
+    parser.add_argument('--config', default=os.path.join(ROOT, 'benchmarks', 'config.json'))
+    parser.add_argument('--users', type=int, default=200, help='Concurrent users')
+    parser.add_argument('--queries', type=int, default=5, help='Queries per user')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='Seconds per stub LLM call')
+    parser.add_argument('--tool', default='addNumbers', help='Tool the stub LLM calls')
+    parser.add_argument('--tool-args', default='{"x": 1, "y": 2}', help='JSON arguments for that tool')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--output', help='Write the summary as JSON to this file')
+    parser.add_argument('--verbose', action='store_true', help='Show host logs')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    host = MCPHost(args.config)
+    host.model = StubModel(tool_calls=[(args.tool, json.loads(args.tool_args))], latency=args.llm_latency)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+    with quiet:
+        await host.start_all_servers(host.load_server_config())
+        await host.load_all_tools()
+        api = APIServer(host, {**host.host_settings.get('api', {}), 'maxConcurrentQueries': args.users})
+        server = uvicorn.Server(uvicorn.Config(api.create_app(), host="127.0.0.1", port=args.port,
+                                               log_level="warning"))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        results: List[Dict[str, Any]] = []
+        url = f"http://127.0.0.1:{args.port}"
+        limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users)
+        start_time = time.perf_counter()
+        async with httpx.AsyncClient(timeout=120, limits=limits) as http:
+            await asyncio.gather(*(run_user(http, url, f"user{u}", args.queries, results)
+                                   for u in range(args.users)))
+        elapsed = time.perf_counter() - start_time
+
+        server.should_exit = True
+        await server_task
+        await host.shutdown()
+
+    ok = [r for r in results if r["status"] == "ok"]
+    latencies = [r["seconds"] for r in ok]
+    first_events = [r["first_event"] for r in ok if r["first_event"] is not None]
+    summary = {
+        "users": args.users,
+        "queries": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "elapsed_seconds": elapsed,
+        "queries_per_second": len(ok) / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "first_event_p50": percentile(first_events, 50),
+        "first_event_p99": percentile(first_events, 99),
+    }
+    for key, value in summary.items():
+        print(f"{key:>20}: {value:.4f}" if isinstance(value, float) else f"{key:>20}: {value}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""MCP SSE (or stdio) server with tools of configurable latency, for benchmarks.
+
+    python benchmarks/stubServer.py --port 8182 --latency 0.05 --jitter 0.01 --prefix slow_
+
+Serves <prefix>echo (returns its text after the configured delay),
+<prefix>payload (returns a string of the requested size after the delay) and
+<prefix>stream (the same string, sent in chunks as progress messages when the
+client asks for progress, with the delay before each chunk).
+Imported as an in-process server it serves echo and payload without delay.
+"""
+import asyncio
+import random
+
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.server.sse import SseServerTransport
+from mcp.server import Server
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Mount, Route
+import uvicorn
+
+
+#Server Name and Description
+xMCP = FastMCP("Benchmark stub")
+
+# Set from the command line before the server starts
+settings = {"latency": 0.0, "jitter": 0.0}
+
+
+async def _delay() -> None:
+    """Sleep for the configured latency plus up to jitter seconds either way"""
+    seconds = settings["latency"] + random.uniform(-settings["jitter"], settings["jitter"])
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+async def echo(text: str = "") -> str:
+    """Return the given text unchanged."""
+    await _delay()
+    return text
+
+
+async def payload(size: int = 1000) -> str:
+    """Return a string of the given number of characters."""
+    await _delay()
+    return "x" * int(size)
+
+
+async def stream(ctx: Context, size: int = 1000, chunk_size: int = 1000) -> str:
+    """Return a string of the given number of characters, in chunks if the client streams results."""
+    meta = ctx.request_context.meta
+    if meta is None or meta.progressToken is None:
+        await _delay()
+        return "x" * int(size)
+    sent = 0
+    while sent < size:
+        await _delay()
+        chunk = "x" * min(int(chunk_size), int(size) - sent)
+        sent += len(chunk)
+        await ctx.report_progress(sent, size, chunk)
+    return ""
+
+
+def register_tools(prefix: str = "") -> None:
+    """Add the echo, payload and stream tools under the given name prefix"""
+    xMCP.add_tool(echo, name=f"{prefix}echo")
+    xMCP.add_tool(payload, name=f"{prefix}payload")
+    xMCP.add_tool(stream, name=f"{prefix}stream")
+
+
+if __name__ != "__main__":
+    # Imported by a host with the in-process transport, which has no command line to pass a prefix
+    register_tools()
+
+
+def create_starlette_app(mcp_server: Server, *, debug: bool = False) -> Starlette:
+    """Create a Starlette application that can server the provied mcp server with SSE."""
+    sse = SseServerTransport("/messages/")
+
+    async def handle_sse(request: Request) -> None:
+        async with sse.connect_sse(
+                request.scope,
+                request.receive,
+                request._send,  # noqa: SLF001
+        ) as (read_stream, write_stream):
+            await mcp_server.run(
+                read_stream,
+                write_stream,
+                mcp_server.create_initialization_options(),
+            )
+
+    return Starlette(
+        debug=debug,
+        routes=[
+            Route("/sse", endpoint=handle_sse),
+            Mount("/messages/", app=sse.handle_post_message),
+        ],
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Run a benchmark stub MCP SSE server')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind to')
+    parser.add_argument('--port', type=int, default=8182, help='Port to listen on')
+    parser.add_argument('--fd', type=int, default=None, help='Listening socket inherited from the host, instead of --host/--port')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds each tool call takes')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- seconds added to the latency')
+    parser.add_argument('--transport', choices=['sse', 'stdio'], default='sse', help='Serve over SSE, or over stdin/stdout')
+    parser.add_argument('--prefix', default='', help='Prefix for the tool names, to run several stubs side by side')
+    args = parser.parse_args()
+
+    settings["latency"] = args.latency
+    settings["jitter"] = args.jitter
+    register_tools(args.prefix)
+
+    starlette_app = create_starlette_app(xMCP._mcp_server)  # noqa: WPS437
+    if args.transport == 'stdio':
+        xMCP.run(transport='stdio')
+    elif args.fd is not None:
+        uvicorn.run(starlette_app, fd=args.fd, log_level="warning")
+    else:
+        uvicorn.run(starlette_app, host=args.host, port=args.port, log_level="warning")
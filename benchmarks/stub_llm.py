@@ -0,0 +1,71 @@
+"""Deterministic stand-in for GenerativeModel so the host can be exercised without Gemini."""
+import asyncio
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+import google.generativeai as genai
+
+protos = genai.protos
+
+
+class StubResponse:
+    """Looks like a (streamed) GenerateContentResponse with a single candidate"""
+
+    def __init__(self, parts: List[Any]):
+        self.candidates = [protos.Candidate(content=protos.Content(role="model", parts=parts))]
+
+    @property
+    def text(self) -> str:
+        return "".join(part.text for part in self.candidates[0].content.parts if part.text)
+
+    async def __aiter__(self):
+        # The whole response arrives as one chunk
+        yield self
+
+
+class StubChat:
+    """Chat session answering planning prompts with tool calls and everything else with text"""
+
+    def __init__(self, model: "StubModel", history: Optional[List[Any]] = None):
+        self.model = model
+        self.history = list(history or [])
+
+    async def send_message_async(self, content, stream: bool = False, generation_config=None, tools=None, **kwargs):
+        if self.model.latency:
+            await asyncio.sleep(self.model.latency)
+        self.history.append(protos.Content(role="user", parts=[protos.Part(text=str(content))]))
+
+        declared = {function["name"] for tool in tools or [] for function in tool.get("function_declarations", [])}
+        generation_config = generation_config or {}
+        if generation_config.get("response_mime_type") == "application/json":
+            # DAG mode planning request
+            steps = [{"id": f"s{i + 1}", "tool": name, "args": args, "depends_on": []}
+                     for i, (name, args) in enumerate(self.model.tool_calls)]
+            parts = [protos.Part(text=json.dumps({"steps": steps}))]
+        elif str(content).startswith("Given the following task") and self.model.tool_calls:
+            parts = [protos.Part(function_call=protos.FunctionCall(name=name, args=args))
+                     for name, args in self.model.tool_calls if name in declared]
+        else:
+            parts = [protos.Part(text=self.model.answer)]
+
+        response = StubResponse(parts)
+        self.history.append(response.candidates[0].content)
+        return response
+
+
+class StubModel:
+    """Replacement for GenerativeModel.
+
+    The first message of each query gets all of tool_calls back as function
+    calls (only those the host declared); follow-ups get the fixed answer.
+    Every call sleeps for latency seconds to mimic the model round-trip.
+    """
+
+    def __init__(self, tool_calls: Optional[List[Tuple[str, Dict[str, Any]]]] = None,
+                 answer: str = "Done.", latency: float = 0.0):
+        self.tool_calls = tool_calls or []
+        self.answer = answer
+        self.latency = latency
+
+    def start_chat(self, history=None) -> StubChat:
+        return StubChat(self, history)
@@ -602,6 +602,12 @@ def create_mcp_server(
 
 @click.command()
 @click.option("--port", default=8000, help="Port to listen on for SSE")
+@click.option(
+    "--fd",
+    default=None,
+    type=int,
+    help="Listening socket inherited from the host, instead of --port",
+)
 @click.option("--chrome-path", default=None, help="Path to Chrome executable")
 @click.option(
     "--window-width",
@@ -621,6 +627,7 @@ def create_mcp_server(
 )
 def main(
     port: int,
+    fd: Optional[int],
     chrome_path: str,
     window_width: int,
     window_height: int,
@@ -635,6 +642,7 @@ def main(
 
     Args:
         port: Port to listen on for SSE
+        fd: File descriptor of an already bound listening socket to serve on
         chrome_path: Path to Chrome executable
         window_width: Browser window width
         window_height: Browser window height
@@ -720,7 +728,10 @@ def main(
         logger.info("Task cleanup process scheduled")
 
     # Run uvicorn server
-    uvicorn.run(starlette_app, host="0.0.0.0", port=port)
+    if fd is not None:
+        uvicorn.run(starlette_app, fd=fd)
+    else:
+        uvicorn.run(starlette_app, host="0.0.0.0", port=port)
 
     return 0
 
@@ -0,0 +1,214 @@
+import asyncio
+import bisect
+import time
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+# Upper bounds of the latency buckets: 1ms growing by 25% per bucket, up to about 20 minutes
+BUCKET_BOUNDS: List[float] = [0.001 * 1.25 ** i for i in range(64)]
+
+
+class CircuitOpenError(Exception):
+    """A call was refused because its server's circuit breaker is open"""
+
+
+class RollingHistogram:
+    """Latencies and errors of the calls in roughly the last window seconds.
+
+    Durations of successful calls are counted in fixed log-spaced buckets, so
+    recording a call and reading a percentile cost the same however many
+    calls were made; failed calls are only counted, so calls cut off by a
+    deadline don't stretch the next deadline. Two
+    generations of buckets are kept and the older one is dropped every
+    window/2 seconds, so the histogram always covers between window/2 and
+    window seconds of calls.
+    """
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._current = [0] * (len(BUCKET_BOUNDS) + 1)
+        self._previous = [0] * (len(BUCKET_BOUNDS) + 1)
+        self._errors = [0, 0]  # current, previous generation
+        self._rotated_at = time.monotonic()
+
+    def _rotate(self) -> None:
+        now = time.monotonic()
+        if now - self._rotated_at < self.window / 2:
+            return
+        if now - self._rotated_at < self.window:
+            self._previous, self._errors[1] = self._current, self._errors[0]
+        else:
+            # Nothing recorded for a whole window, forget both generations
+            self._previous, self._errors[1] = [0] * len(self._current), 0
+        self._current, self._errors[0] = [0] * len(self._current), 0
+        self._rotated_at = now
+
+    def record(self, seconds: float, ok: bool = True) -> None:
+        self._rotate()
+        if ok:
+            self._current[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        else:
+            self._errors[0] += 1
+
+    @property
+    def successes(self) -> int:
+        self._rotate()
+        return sum(self._current) + sum(self._previous)
+
+    @property
+    def count(self) -> int:
+        return self.successes + sum(self._errors)
+
+    @property
+    def error_rate(self) -> float:
+        count = self.count
+        return sum(self._errors) / count if count else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the pct-th percentile latency of successful calls, in seconds
+        (0 without any)"""
+        count = self.successes
+        if not count:
+            return 0.0
+        rank = pct / 100 * count
+        seen = 0
+        for i, (current, previous) in enumerate(zip(self._current, self._previous)):
+            seen += current + previous
+            if seen >= rank:
+                return BUCKET_BOUNDS[min(i, len(BUCKET_BOUNDS) - 1)]
+        return BUCKET_BOUNDS[-1]
+
+    def summary(self) -> Dict[str, float]:
+        return {"count": self.count, "error_rate": self.error_rate, "p50_s": self.percentile(50),
+                "p99_s": self.percentile(99)}
+
+
+class CircuitBreaker:
+    """Stops calls to a server that keeps failing, and lets them through again once it answers.
+
+    The breaker trips (opens) after failureThreshold failures in a row, or when
+    at least minCalls calls were made in the last window seconds and more
+    than errorRate of them failed. A failure is a call that raised or timed
+    out; a tool returning an error result is the tool's answer, not a failure.
+    While open, calls fail fast with CircuitOpenError and the server's tools
+    are hidden from the LLM. After openSeconds the breaker goes half-open and
+    pings the server; halfOpenProbes successful pings in a row close it, a
+    failed one opens it again for twice as long, up to maxOpenSeconds.
+
+    Settings come from the "circuitBreaker" section of config.json, at the top
+    level and per server: enabled (default true), failureThreshold (default 5),
+    errorRate (default 0.5), minCalls (default 10), window (default 60),
+    openSeconds (default 30), maxOpenSeconds (default 300), halfOpenProbes (default 2).
+    """
+
+    def __init__(self, server_name: str, probe: Callable[[], Awaitable[Any]]):
+        self.server_name = server_name
+        # Checks that the server answers, e.g. a ping; raises if it doesn't
+        self._probe = probe
+        self.enabled = True
+        self.failure_threshold = 5
+        self.error_rate = 0.5
+        self.min_calls = 10
+        self.window = 60.0
+        self.open_seconds = 30.0
+        self.max_open_seconds = 300.0
+        self.half_open_probes = 2
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.calls = RollingHistogram(self.window)
+        self.opened_at = 0.0
+        self._open_for = self.open_seconds
+        self._probe_task: Optional[asyncio.Task] = None
+        self.stats = {"trips": 0, "rejected": 0, "probes": 0, "probe_failures": 0}
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the circuit breaker settings from config.json"""
+        self.enabled = bool(settings.get('enabled', True))
+        self.failure_threshold = int(settings.get('failureThreshold', self.failure_threshold))
+        self.error_rate = float(settings.get('errorRate', self.error_rate))
+        self.min_calls = int(settings.get('minCalls', self.min_calls))
+        self.window = float(settings.get('window', self.window))
+        self.open_seconds = float(settings.get('openSeconds', self.open_seconds))
+        self.max_open_seconds = float(settings.get('maxOpenSeconds', self.max_open_seconds))
+        self.half_open_probes = int(settings.get('halfOpenProbes', self.half_open_probes))
+        self.calls = RollingHistogram(self.window)
+        self._open_for = self.open_seconds
+
+    @property
+    def closed(self) -> bool:
+        return self.state == "closed"
+
+    @property
+    def allows_calls(self) -> bool:
+        return self.closed or not self.enabled
+
+    def check(self) -> None:
+        """Raise CircuitOpenError unless calls to the server are allowed"""
+        if self.allows_calls:
+            return
+        self.stats["rejected"] += 1
+        retry_in = max(0.0, self.opened_at + self._open_for - time.monotonic())
+        raise CircuitOpenError(f"Server '{self.server_name}' is failing, calls are paused "
+                               f"({self.state}, next check in {retry_in:.0f}s)")
+
+    def record(self, seconds: float, ok: bool) -> None:
+        """Count one call's outcome, tripping the breaker if the server keeps failing"""
+        self.calls.record(seconds, ok)
+        if ok:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if not self.enabled or not self.closed:
+            return
+        if self.consecutive_failures >= self.failure_threshold:
+            self._trip(f"{self.consecutive_failures} failures in a row")
+        elif self.calls.count >= self.min_calls and self.calls.error_rate > self.error_rate:
+            self._trip(f"{self.calls.error_rate:.0%} of {self.calls.count} calls failed")
+
+    def _trip(self, reason: str) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.stats["trips"] += 1
+        print(f"\n[circuit] Opening the circuit of '{self.server_name}' for {self._open_for:.0f}s: {reason}")
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_until_closed())
+
+    async def _probe_until_closed(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(max(0.0, self.opened_at + self._open_for - time.monotonic()))
+            self.state = "half_open"
+            succeeded = 0
+            while succeeded < self.half_open_probes:
+                self.stats["probes"] += 1
+                try:
+                    await self._probe()
+                except Exception as e:
+                    self.stats["probe_failures"] += 1
+                    self._open_for = min(self._open_for * 2, self.max_open_seconds)
+                    self.state = "open"
+                    self.opened_at = time.monotonic()
+                    print(f"[circuit] '{self.server_name}' still failing ({str(e) or type(e).__name__}), "
+                          f"checking again in {self._open_for:.0f}s")
+                    break
+                succeeded += 1
+            else:
+                self.reset()
+                print(f"[circuit] '{self.server_name}' answers again, closing its circuit")
+
+    def reset(self) -> None:
+        """Close the breaker and forget past failures, e.g. once the server was restarted"""
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._open_for = self.open_seconds
+        self.calls = RollingHistogram(self.window)
+
+    async def stop(self) -> None:
+        """Stop probing and close the breaker"""
+        task, self._probe_task = self._probe_task, None
+        if task and task is not asyncio.current_task():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.reset()
+
+    def summary(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures,
+                **self.calls.summary(), **self.stats}
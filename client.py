@@ -1,154 +1,519 @@
 import asyncio
-import json
-import sys
-from typing import Dict, Any, Optional, List  # Make sure these imports are present
-from contextlib import AsyncExitStack
+from typing import Dict, Any, Optional, List, Set, Tuple  # Make sure these imports are present
+from contextlib import AsyncExitStack, asynccontextmanager
 import re
+import socket
 import time
-import subprocess
 
+import httpx
+from tracing import tracer
+from server_output import OutputBuffer
 from mcp import ClientSession
+import mcp.types as types
 from mcp.client.sse import sse_client
+from circuit_breaker import CircuitBreaker, RollingHistogram
+from session_pool import SessionPool, PooledSession
+from schema_compiler import schema_compiler
+from result_streaming import ResultStream, ProgressCallback, cap_result
+from supervisor import is_connection_error
+from transports import TRANSPORTS, stdio_streams, inprocess_streams, load_inprocess_server
+
+# Lines a server may print to announce the port it listens on (ours, and uvicorn's startup message)
+PORT_PATTERNS = [re.compile(r'Listening on (\d+)'), re.compile(r'running on https?://[^\s/]+:(\d+)')]
+
+# Longest line read from a server's output in one piece
+STREAM_LIMIT = 1024 * 1024
 
 
 class MCPClient:
     def __init__(self, server_name: str, server_config: Dict[str, Any]):
          # Initialize session and client objects
         self.session: Optional[ClientSession] = None
-        self.running_server: Dict[str, subprocess.Popen] = {}
+        self.running_server: Dict[str, asyncio.subprocess.Process] = {}
+        # Everything the server process prints, drained continuously so its pipes never fill up
+        self.output = OutputBuffer(int(server_config.get('outputBufferLines', 1000)))
+        self._output_tasks: List[asyncio.Task] = []
+        # Fire-and-forget work such as tool list refreshes; the loop only keeps weak references
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._port_detected: Optional[asyncio.Future] = None
         self.exit_stack = AsyncExitStack()
         self.base_url: str = ""  # Empty string instead of type
         self.port: int = 0       # Default value instead of type
+        # "fixed": the port comes from the args or config; "auto": the host picks a free port and passes
+        # --port; "socket": the host binds a listening socket and passes it to the server with --fd
+        self.port_allocation: str = server_config.get('portAllocation', 'fixed')
+        self.connect_host: str = "localhost"
+        # "sse": HTTP to the server's /sse endpoint; "stdio": JSON-RPC over the spawned process's
+        # stdin/stdout; "inprocess": a trusted FastMCP module imported and run on the host's own loop
+        self.transport: str = server_config.get('transport', 'sse')
+        # URL of an already running server to attach to instead of starting one
+        self.attached_url: Optional[str] = server_config.get('url')
+        self._inprocess_server = None
         self.server_name: str = server_name  # Store the actual value
         self.server_config: Dict[str, Any] = server_config  # Store the actual value
-        self._streams_context = None  # Add this
-        self._session_context = None  # Add this
+        # Sessions to the server; the first is self.session, the others only carry tool calls
+        self.pool = SessionPool(server_name, self._hold_connection)
+        # Latency and errors of recent calls per tool, which set each tool's call deadline
+        self.tool_latency: Dict[str, RollingHistogram] = {}
+        self.call_timeout = 300.0
+        self.timeout_factor = 3.0
+        self.min_call_timeout = 5.0
+        self.timeout_min_samples = 20
+        self.breaker = CircuitBreaker(server_name, self._probe)
+        # Tools whose servers send their results in pieces, and the most of a result that is read
+        self.streaming_tools: Set[str] = set()
+        self.max_result_chars = 1_000_000
+        self.configure(server_config)
         self.tools = []
+        # Bumped whenever self.tools is replaced so callers can cache derived data
+        self.tools_version: int = 0
+        self.startup_error: str = ""
+        # Seconds from spawn until the server answered / the session was up, and probe count
+        self.startup_metrics: Dict[str, float] = {"ready": 0.0, "connected": 0.0, "probes": 0}
+        # Name and version the server reported when the session was initialized
+        self.server_info: Optional[types.Implementation] = None
+        # Lazy servers are advertised from a stored manifest and started on first use
+        self.lazy: bool = False
+        self.idle_timeout: float = 0.0
+        self.last_used: float = time.monotonic()
+        self.in_flight: int = 0
 
     async def connect_to_sse_server(self, server_url: str):
         """Connect to an MCP server running with SSE transport"""
-        # Store the context managers so they stay alive
-        self._streams_context = sse_client(url=server_url)
-        streams = await self._streams_context.__aenter__()
-        print("Got SSE streams")
-
-        print("Creating ClientSession")
-        self._session_context = ClientSession(*streams)
-        self.session: ClientSession = await self._session_context.__aenter__()
-        print("Session created successfully")
-
-        # Initialize tools
-        await self.session.initialize()
-
-        # List available tools to verify connection
-        print("Initialized SSE client...")
-        print("Listing tools...")
-        response = await self.session.list_tools()
+        self.base_url = server_url
+        await self.connect()
+
+    async def connect(self):
+        """Open a session to the server over its configured transport, plus the pool's minSessions"""
+        try:
+            await self.pool.open()
+        except BaseException:
+            await self.cleanup()
+            raise
+        try:
+            await self.pool.fill()
+        except Exception as e:
+            print(f"Could only open {len(self.pool.members)} sessions to '{self.server_name}': {e}")
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the session pool, call timeout, result size and circuit breaker settings.
+
+        Call deadlines adapt to each tool's recent latency: timeoutFactor times
+        the p99 of its successful calls, but at least minCallTimeout and at
+        most callTimeout. Until a tool has timeoutMinSamples recent successful
+        calls, callTimeout applies. A stdio server only ever has one session.
+        Results are cut off after maxResultChars characters (0 for no limit);
+        those of streamingTools are read as they arrive and the call is
+        cancelled once that many were read.
+        """
+        self.pool.configure(settings)
+        if self.transport == 'stdio':
+            self.pool.min_size = self.pool.max_size = 1
+        self.call_timeout = float(settings.get('callTimeout', self.call_timeout))
+        self.timeout_factor = float(settings.get('timeoutFactor', self.timeout_factor))
+        self.min_call_timeout = float(settings.get('minCallTimeout', self.min_call_timeout))
+        self.timeout_min_samples = int(settings.get('timeoutMinSamples', self.timeout_min_samples))
+        self.breaker.configure(settings.get('circuitBreaker', {}))
+        self.streaming_tools = set(settings.get('streamingTools', self.streaming_tools))
+        self.max_result_chars = int(settings.get('maxResultChars', self.max_result_chars))
+
+    @asynccontextmanager
+    async def _open_streams(self):
+        """Read/write streams to the server over its transport"""
+        if self.transport == "stdio":
+            process = self.running_server[self.server_name]
+            async with stdio_streams(process, lambda line: self._record_line("stdout", line)) as streams:
+                yield streams
+        elif self.transport == "inprocess":
+            async with inprocess_streams(self._inprocess_server) as streams:
+                yield streams
+        else:
+            async with sse_client(url=self.base_url, headers=self.server_config.get('headers')) as streams:
+                yield streams
+
+    async def _hold_connection(self, member: PooledSession, ready: asyncio.Future):
+        """Keep one pooled session and its streams open until it is closed.
+
+        The streams and session are entered and exited by this one long-lived
+        task, since anyio does not allow a context to be exited from another task.
+        """
+        primary = member.index == 0
+        try:
+            async with self._open_streams() as streams:
+                if not primary:
+                    async with ClientSession(*streams) as session:
+                        await session.initialize()
+                        member.session = session
+                        ready.set_result(None)
+                        await member.closing.wait()
+                    return
+
+                print(f"Got {self.transport} streams")
+
+                print("Creating ClientSession")
+                async with ClientSession(*streams, message_handler=self._handle_message) as session:
+                    self.session = session
+                    print("Session created successfully")
+
+                    # Initialize tools
+                    initialized = await self.session.initialize()
+                    self.server_info = getattr(initialized, "serverInfo", None)
+                    member.session = session
+
+                    # List available tools to verify connection
+                    print(f"Initialized {self.transport} client...")
+                    print("Listing tools...")
+                    await self.refresh_tools()
+                    print("\nConnected to server with tools:", [tool.name for tool in self.tools])
+                    ready.set_result(None)
+
+                    await member.closing.wait()
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e if isinstance(e, Exception) else Exception(f"Connection to '{self.server_name}' closed"))
+            elif not isinstance(e, asyncio.CancelledError):
+                print(f"Connection to server '{self.server_name}' lost: {e}")
+        finally:
+            member.session = None
+            if primary:
+                self.session = None
+
+    async def refresh_tools(self) -> None:
+        """Re-fetch the tool list from the server and bump tools_version"""
+        with tracer.span("list_tools", server=self.server_name):
+            response = await self.session.list_tools()
         self.tools = response.tools if hasattr(response, 'tools') else []
-        print("\nConnected to server with tools:", [tool.name for tool in self.tools])
+        self.tools_version += 1
+
+    async def _handle_message(self, message) -> None:
+        """Refresh the tool list when the server says it changed"""
+        if isinstance(message, types.ServerNotification) and \
+                isinstance(message.root, types.ToolListChangedNotification):
+            print(f"Tool list changed on server '{self.server_name}', refreshing")
+            # list_tools needs the receive loop this handler runs on, so don't await it here
+            self._run_in_background(self.refresh_tools(), "refresh tools")
+
+    def _run_in_background(self, coro, action: str) -> asyncio.Task:
+        """Run coro as a task that is kept alive until it finishes and whose failure is logged"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+
+        def _done(task: asyncio.Task) -> None:
+            self._background_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                error = task.exception()
+                print(f"Could not {action} on '{self.server_name}': {str(error) or type(error).__name__}")
+
+        task.add_done_callback(_done)
+        return task
 
     async def cleanup(self):
-        """Properly clean up the session and streams"""
-        if self._session_context:
-            await self._session_context.__aexit__(None, None, None)
-        if self._streams_context:
-            await self._streams_context.__aexit__(None, None, None)
-
-    async def detect_server_port(self, process: subprocess.Popen, timeout: int = 10) -> Optional[int]:
-        """Detect the port of the running server"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            output = process.stdout.readline()
-            if output:
-                match = re.search(r'Listening on (\d+)', output)
-                if match:
-                    port = int(match.group(1))
-                    print(f"Detected port {port} for server '{self.server_name}'")
-                    return port
-            await asyncio.sleep(0.1)
-        print(f"Timeout waiting for port detection after {timeout} seconds")
+        """Properly clean up the sessions and streams"""
+        background = list(self._background_tasks)
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await self.pool.close()
+        self.session = None
+
+    @property
+    def attached(self) -> bool:
+        """Whether this client attaches to a server running elsewhere rather than starting one"""
+        return bool(self.attached_url)
+
+    def process_running(self) -> bool:
+        """Whether the server process this client started is still alive"""
+        process = self.running_server.get(self.server_name)
+        return process is not None and process.returncode is None
+
+    def can_reconnect(self) -> bool:
+        """Whether a lost session can be reopened without starting the server again"""
+        return self.transport == 'sse' and (self.attached or self.process_running())
+
+    def connection_problem(self) -> Optional[str]:
+        """Why a started server can't take calls (its process exited or its session dropped), or None.
+
+        Clients without a server process of their own (other than in-process and attached servers)
+        are never reported.
+        """
+        process = self.running_server.get(self.server_name)
+        if process is None and self.transport != "inprocess" and not self.attached:
+            return None
+        if process is not None and process.returncode is not None:
+            return f"exited with code {process.returncode}"
+        primary = self.pool.members[0] if self.pool.members else None
+        if primary is None or (self.session is None and not primary.task.done()):
+            # Not connected yet, or still connecting
+            return None
+        if self.session is None or primary.task.done():
+            return "lost its session"
         return None
 
+    async def reconnect(self) -> None:
+        """Open a new session to the still running (or attached) server"""
+        if self.transport != "sse":
+            # A stdio or in-process server serves one session for its lifetime
+            raise Exception(f"a {self.transport} session can't be reopened, the server must be restarted")
+        await self.cleanup()
+        await asyncio.wait_for(self.connect(), timeout=60)
+
+    async def restart(self) -> None:
+        """Stop the server process and start it again (or just reattach to an attached server)"""
+        await self.stop_server()
+        self.startup_error = ""
+        await self.start_server()
+        if not self.session:
+            raise Exception(self.startup_error or "no session established")
+
+    def _record_line(self, stream_name: str, line: str, log_output: Optional[bool] = None) -> str:
+        """Keep one line of server output, echoing it if logOutput is set"""
+        self.output.append(stream_name, line)
+        if log_output if log_output is not None else self.server_config.get('logOutput', False):
+            print(f"[{self.server_name}] {line}")
+        return line
+
+    async def _drain_output(self, stream: asyncio.StreamReader, stream_name: str) -> None:
+        """Read one pipe of the server process into the output buffer until the process closes it"""
+        log_output = bool(self.server_config.get('logOutput', False))
+        while True:
+            try:
+                data = await stream.readline()
+            except ValueError:
+                # The line was longer than STREAM_LIMIT and has been discarded
+                self.output.append(stream_name, f"[line longer than {STREAM_LIMIT} bytes dropped]")
+                continue
+            if not data:
+                break
+            line = self._record_line(stream_name, data.decode(errors='replace').rstrip('\r\n'), log_output)
+            if self._port_detected is not None and not self._port_detected.done():
+                for pattern in PORT_PATTERNS:
+                    match = pattern.search(line)
+                    if match:
+                        self._port_detected.set_result(int(match.group(1)))
+                        break
+
+    async def detect_server_port(self, timeout: float = 10) -> Optional[int]:
+        """Wait for the server to print the port it listens on"""
+        try:
+            port = await asyncio.wait_for(asyncio.shield(self._port_detected), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"Timeout waiting for port detection after {timeout} seconds")
+            return None
+        print(f"Detected port {port} for server '{self.server_name}'")
+        return port
+
+    async def _raise_if_exited(self, process: asyncio.subprocess.Process) -> None:
+        """Raise with the server's last output if the process has already exited"""
+        if process.returncode is None:
+            return
+        if self._output_tasks:
+            # Let the readers pick up whatever the server printed before exiting
+            await asyncio.wait(self._output_tasks, timeout=1)
+        print(f"Server '{self.server_name}' failed to start (exit code {process.returncode}):")
+        for line in self.output.tail(20):
+            print(f"  {line}")
+        errors = [line for _, stream, line in self.output.lines if stream == "stderr" and line.strip()]
+        detail = f": {errors[-1]}" if errors else ""
+        raise Exception(f"Server '{self.server_name}' exited with code {process.returncode}{detail}")
+
+    async def wait_until_ready(self, process: asyncio.subprocess.Process) -> None:
+        """Probe the /sse endpoint with exponential backoff until the server answers.
+
+        The backoff starts at readyInitialDelay and doubles up to readyMaxDelay;
+        the server is given up on after readyTimeout seconds or as soon as its
+        process exits.
+        """
+        delay = float(self.server_config.get('readyInitialDelay', 0.05))
+        max_delay = float(self.server_config.get('readyMaxDelay', 1.0))
+        timeout = float(self.server_config.get('readyTimeout', 60))
+        url = f"http://{self.connect_host}:{self.port}/sse"
+        deadline = time.perf_counter() + timeout
+
+        async with httpx.AsyncClient(timeout=max(max_delay, 1.0)) as http:
+            while True:
+                self.startup_metrics["probes"] += 1
+                try:
+                    async with http.stream("GET", url) as response:
+                        if response.status_code == 200:
+                            return
+                except httpx.HTTPError:
+                    pass
+
+                await self._raise_if_exited(process)
+                if time.perf_counter() + delay > deadline:
+                    raise Exception(f"Server '{self.server_name}' not ready at {url} after {timeout:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
+
+    def _allocate_port(self, args: List[str]) -> Tuple[List[str], Optional[socket.socket]]:
+        """Pick a free local port for the server and put it (or a socket bound to it) in its args.
+
+        In "socket" mode the returned socket is already bound and listening, so
+        nothing else can take the port before the server starts; it must be
+        passed to the server process. Args may place the value with "{port}" or
+        "{fd}"; otherwise "--port <port>" or "--fd <fd>" is appended, replacing
+        any --port in the configured args.
+        """
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        self.port = listener.getsockname()[1]
+        self.connect_host = "127.0.0.1"
+        if self.port_allocation == 'socket':
+            listener.listen(128)
+            listener.set_inheritable(True)
+            values = {"port": str(self.port), "fd": str(listener.fileno())}
+            flag = ["--fd", values["fd"]]
+        else:
+            # Released again for the server to bind; only "socket" mode is free of races
+            listener.close()
+            listener = None
+            values = {"port": str(self.port)}
+            flag = ["--port", values["port"]]
+
+        templated = any("{port}" in arg or "{fd}" in arg for arg in args)
+        allocated = []
+        skip_next = False
+        for arg in args:
+            if skip_next:
+                skip_next = False
+                continue
+            if not templated and arg in ('--port', '-p'):
+                skip_next = True
+                continue
+            if not templated and (arg.startswith('--port=') or arg.startswith('-p=')):
+                continue
+            allocated.append(arg.replace("{port}", values["port"]).replace("{fd}", values.get("fd", "")))
+        if not templated:
+            allocated += flag
+        print(f"Allocated port {self.port} for server '{self.server_name}' ({self.port_allocation})")
+        return allocated, listener
+
+    async def _spawn(self, full_command: List[str], listener: Optional[socket.socket]) -> asyncio.subprocess.Process:
+        """Start the server process with its output drained into the output buffer.
+
+        For the stdio transport stdin/stdout carry the protocol, so only stderr
+        is drained here; stdout is read by the session.
+        """
+        stdio = self.transport == 'stdio'
+        self._port_detected = asyncio.get_running_loop().create_future()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *full_command,
+                stdin=asyncio.subprocess.PIPE if stdio else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=STREAM_LIMIT,
+                pass_fds=(listener.fileno(),) if listener else (),
+            )
+        finally:
+            # The server has its own copy of the listening socket now
+            if listener:
+                listener.close()
+        self._output_tasks = [asyncio.create_task(self._drain_output(process.stderr, "stderr"))]
+        if not stdio:
+            self._output_tasks.append(asyncio.create_task(self._drain_output(process.stdout, "stdout")))
+        self.running_server[self.server_name] = process
+        return process
+
     async def start_server(self) -> List[Dict[str, Any]]:  
-        """Start an MCP server and establish SSE connection."""
+        """Start an MCP server and connect to it over its transport."""
         try:
             tool_list = []
 
+            if self.transport not in TRANSPORTS:
+                raise Exception(f"Unknown transport '{self.transport}', expected one of {', '.join(TRANSPORTS)}")
+            if self.attached and self.transport != 'sse':
+                raise Exception(f"Only SSE servers can be attached to by URL, not {self.transport}")
+
             # Extract the port from the arguments if "--port" is specified
-            command = [self.server_config['command']]
+            command = [self.server_config.get('command', '')]
             args = self.server_config.get('args', [])
             
-            # Look for "--port" or "-p" in the arguments
             port = None
-            for i, arg in enumerate(args):
-                if arg in ['--port', '-p'] and i + 1 < len(args) and args[i + 1].isdigit():
-                    port = int(args[i + 1])
-                    print(f"Found port {port} in command arguments")
-                    self.port = port
-                    break
-                # Also handle combined format like "--port=8000"
-                elif arg.startswith('--port=') or arg.startswith('-p='):
-                    port_str = arg.split('=')[1]
-                    if port_str.isdigit():
-                        port = int(port_str)
+            listener = None
+            if self.transport != 'sse' or self.attached:
+                # Talks over the process's pipes, in memory or to a given URL, no port to pick
+                pass
+            elif self.port_allocation in ('auto', 'socket'):
+                # The host picks the port, so servers (and hosts) sharing a machine never collide
+                args, listener = self._allocate_port(args)
+                port = self.port
+            else:
+                # Look for "--port" or "-p" in the arguments
+                for i, arg in enumerate(args):
+                    if arg in ['--port', '-p'] and i + 1 < len(args) and args[i + 1].isdigit():
+                        port = int(args[i + 1])
                         print(f"Found port {port} in command arguments")
                         self.port = port
                         break
+                    # Also handle combined format like "--port=8000"
+                    elif arg.startswith('--port=') or arg.startswith('-p='):
+                        port_str = arg.split('=')[1]
+                        if port_str.isdigit():
+                            port = int(port_str)
+                            print(f"Found port {port} in command arguments")
+                            self.port = port
+                            break
             
-            # If no port in args, check config
-            if port is None and 'port' in self.server_config:
-                port = int(self.server_config['port'])
-                print(f"Using port {port} from config")
-                self.port = port
-            
-            # Start the server process
-            full_command = command + args
-            print(f"Starting server '{self.server_name}' with command: {' '.join(full_command)}")
-            
-            process = subprocess.Popen(
-                full_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
+                # If no port in args, check config
+                if port is None and 'port' in self.server_config:
+                    port = int(self.server_config['port'])
+                    print(f"Using port {port} from config")
+                    self.port = port
             
-            self.running_server[self.server_name] = process
-            # Wait a bit for the server to start
-            await asyncio.sleep(5)
-            if process.poll() is not None:
-                stdout, stderr = process.communicate()
-                print(f"Server '{self.server_name}' failed to start:")
-                print(f"stdout: {stdout}")
-                print(f"stderr: {stderr}")
-                raise Exception(f"Server '{self.server_name}' failed to start")
-
-            # If we still don't have the port, try to detect it
-            if not hasattr(self, 'port') or not self.port:
-                try:
-                    self.port = await self.detect_server_port(process)
-                except Exception as e:
-                    print(f"Error detecting port: {e}")
-                    # Don't raise - continue with default port
-                
-                if not self.port:
-                    # Fallback to default port if detection fails
-                    self.port = 8000
-                    print(f"Could not detect port, using default port {self.port}")
+            if self.transport == 'inprocess':
+                spawn_time = time.perf_counter()
+                self._inprocess_server = load_inprocess_server(self.server_config['module'],
+                                                               self.server_config.get('object'))
+                print(f"Loaded in-process server '{self.server_name}' from {self.server_config['module']}")
+            elif self.attached:
+                # Already running: skip spawning and readiness polling, connecting is the health check
+                spawn_time = time.perf_counter()
+                self.base_url = self.attached_url
+                print(f"Attaching to server '{self.server_name}' at {self.base_url}")
+            else:
+                # Start the server process
+                full_command = command + args
+                print(f"Starting server '{self.server_name}' with command: {' '.join(full_command)}")
+                process = await self._spawn(full_command, listener)
+                spawn_time = time.perf_counter()
+                await self._raise_if_exited(process)
+
+            if self.transport == 'sse' and not self.attached:
+                # If we still don't have the port, try to detect it
+                if not hasattr(self, 'port') or not self.port:
+                    try:
+                        self.port = await self.detect_server_port()
+                    except Exception as e:
+                        print(f"Error detecting port: {e}")
+                        # Don't raise - continue with default port
+
+                    if not self.port:
+                        # Fallback to default port if detection fails
+                        self.port = 8000
+                        print(f"Could not detect port, using default port {self.port}")
+
+                # Poll the SSE endpoint until the server answers instead of sleeping blindly
+                await self.wait_until_ready(process)
+                self.base_url = f"http://{self.connect_host}:{self.port}/sse"
+            self.startup_metrics["ready"] = time.perf_counter() - spawn_time
             print("Came here 1")
-            # Create SSE client and connect
+            # Create the client and connect
             try:
-                self.base_url = f"http://localhost:{self.port}/sse"
-                print(f"Connecting to server '{self.server_name}' at {self.base_url}")
+                print(f"Connecting to server '{self.server_name}' over {self.transport}"
+                      + (f" at {self.base_url}" if self.transport == 'sse' else ""))
                 
                 # Add timeout for connection attempt
                 await asyncio.wait_for(
-                    self.connect_to_sse_server(self.base_url),
+                    self.connect(),
                     timeout=60  # Increase timeout to 60 seconds
                 )
                 
                 print(f"Successfully connected to server '{self.server_name}'")
+                self.startup_metrics["connected"] = time.perf_counter() - spawn_time
+                print(f"Server '{self.server_name}' ready in {self.startup_metrics['ready']:.3f}s "
+                      f"after {self.startup_metrics['probes']} probes, "
+                      f"connected in {self.startup_metrics['connected']:.3f}s")
                 
                 # Get and format tools
                 try:
@@ -187,11 +552,10 @@ class MCPClient:
                     
                 except Exception as tool_error:
                     print(f"Error getting tools: {tool_error}")
-                    # Try to retrieve any error output from the server
-                    if hasattr(process, 'stderr') and process.stderr:
-                        error_output = process.stderr.read()
-                        if error_output:
-                            print(f"Server error output: {error_output}")
+                    # Show what the server printed last
+                    error_output = self.output.tail(20, "stderr")
+                    if error_output:
+                        print("Server error output:\n" + "\n".join(error_output))
                     raise Exception(f"Failed to get tools: {str(tool_error)}")
                 
             except asyncio.TimeoutError:
@@ -203,6 +567,7 @@ class MCPClient:
             import traceback
             print(f"Error with server '{self.server_name}':")
             traceback.print_exc()  # Print full traceback
+            self.startup_error = str(e)
             await self.stop_server()
             return []
 
@@ -211,22 +576,34 @@ class MCPClient:
         try:
             # First, clean up the session
             await self.cleanup()
+            # A stopped server has nothing left to probe, and starts again with a clean record
+            await self.breaker.stop()
             
             # Then terminate the process
             if self.server_name in self.running_server:
                 process = self.running_server[self.server_name]
                 try:
-                    process.terminate()
-                    try:
-                        process.wait(timeout=5)
-                    except subprocess.TimeoutExpired:
-                        print(f"Process didn't terminate, killing it")
-                        process.kill()
-                        process.wait(timeout=2)
+                    if process.returncode is None:
+                        process.terminate()
+                        try:
+                            await asyncio.wait_for(process.wait(), timeout=5)
+                        except asyncio.TimeoutError:
+                            print(f"Process didn't terminate, killing it")
+                            process.kill()
+                            await asyncio.wait_for(process.wait(), timeout=2)
+                except ProcessLookupError:
+                    pass
                 except Exception as e:
                     print(f"Error terminating process: {e}")
                 
                 del self.running_server[self.server_name]
+
+            # The readers finish once the process has closed its pipes
+            if self._output_tasks:
+                _, pending = await asyncio.wait(self._output_tasks, timeout=1)
+                for task in pending:
+                    task.cancel()
+                self._output_tasks = []
                 
             print("Stopped server", self.server_name)
             
@@ -234,146 +611,132 @@ class MCPClient:
             print(f"Error in stop_server: {e}")
 
 
-    async def processToolsForGemini(self) -> List[Dict[str, Any]]:
-        """Process a query using Gemini and available tools"""
-        # Format messages for Gemini
-        # Convert MCP tools to Gemini function format
-        print(self.session)
-        print(self)
-        print(self.tools)
-        local_tool_list = await self.session.list_tools()
-        #print(f"Got local_tool_list with {len(local_tool_list.tools) if local_tool_list and hasattr(local_tool_list, 'tools') else 0} tools")
-        available_functions = []
-        for tool in local_tool_list.tools:
-            # Default parameters with a simple string parameter if none provided
-            parameters = {
-                "type": "object",
-                "properties": {}  # Start with empty properties object
-            }
-            
-            # Try to extract schema from inputSchema if available
-            if hasattr(tool, "inputSchema") and tool.inputSchema:
-                try:
-                    # If it's a string, parse it as JSON
-                    if isinstance(tool.inputSchema, str):
-                        schema = json.loads(tool.inputSchema)
-                    else:
-                        schema = tool.inputSchema
-                    
-                    # Clean up the schema to remove unsupported fields
-                    cleaned_schema = self._clean_json_schema(schema)
-                    
-                    # Only update if we have valid properties
-                    if "properties" in cleaned_schema and cleaned_schema["properties"]:
-                        parameters["properties"] = cleaned_schema["properties"]
-                        
-                        # Add required fields only if they exist in properties
-                        if "required" in cleaned_schema and isinstance(cleaned_schema["required"], list):
-                            valid_required = []
-                            for prop in cleaned_schema["required"]:
-                                if isinstance(prop, str) and prop in parameters["properties"]:
-                                    valid_required.append(prop)
-                                else:
-                                    print(f"Warning: Required property '{prop}' not found in properties for tool {tool.name}")
-                            
-                            if valid_required:
-                                parameters["required"] = valid_required
-                except (json.JSONDecodeError, TypeError, AttributeError) as e:
-                    print(f"Error parsing schema for {tool.name}: {e}")
-            
-            # If no properties were added, use the default input parameter
-            if not parameters["properties"]:
-                parameters["properties"] = {
-                    "input": {
-                        "type": "string",
-                        "description": "Input for the tool"
-                    }
-                }
-                parameters["required"] = ["input"]
-                      
-            function = {
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": parameters
-            }
-            # Debug output for this function
-            #print(f"\nFunction declaration for {tool.name}:")
-            #print(json.dumps(function, indent=2))
-            if "required" in parameters:
-                for req in parameters["required"]:
-                    if req not in parameters["properties"]:
-                        print(f"ERROR: Required property '{req}' not in properties!")
-            
-            available_functions.append(function)
-        return available_functions
-
-    def _clean_json_schema(self, schema):
-            """Clean JSON schema by handling or removing unsupported fields."""
-            # These are fields that might cause issues with Gemini
-            unsupported_fields = [
-                "anyOf", "allOf", "oneOf", "not", "$ref", 
-                "additionalProperties", "patternProperties", "propertyNames",
-                "dependencies", "if", "then", "else", "default",
-                "const", "enum", "format", "contentEncoding", "contentMediaType",
-                "examples", "title", "definitions", "$schema", "$id",
-                "uniqueItems", "contains", "multipleOf", "exclusiveMinimum", 
-                "exclusiveMaximum", "pattern"
-            ]
-            
-            if not isinstance(schema, dict):
-                return schema
-                
-            cleaned = {}
-            for key, value in schema.items():
-                # Handle unsupported fields
-                if key in unsupported_fields:
-                    # For anyOf/oneOf, try to use the first schema option
-                    if key in ["anyOf", "oneOf"] and isinstance(value, list) and value:
-                        # Take the first option as a simplification
-                        first_option = value[0]
-                        if isinstance(first_option, dict):
-                            for sub_key, sub_value in first_option.items():
-                                # Don't overwrite existing keys
-                                if sub_key not in cleaned:
-                                    cleaned[sub_key] = self._clean_json_schema(sub_value)
-                    # For allOf, try to merge all schemas (simplified approach)
-                    elif key == "allOf" and isinstance(value, list):
-                        for sub_schema in value:
-                            if isinstance(sub_schema, dict):
-                                for sub_key, sub_value in sub_schema.items():
-                                    # Don't overwrite existing keys
-                                    if sub_key not in cleaned:
-                                        cleaned[sub_key] = self._clean_json_schema(sub_value)
-                    # Special handling for enum values (convert to string description)
-                    elif key == "enum" and isinstance(value, list):
-                        if "description" not in cleaned:
-                            enum_values = ", ".join([str(v) for v in value])
-                            cleaned["description"] = f"Allowed values: {enum_values}"
-                    # Handle title by adding it to description
-                    elif key == "title" and isinstance(value, str):
-                        if "description" in cleaned:
-                            cleaned["description"] = f"{value}: {cleaned['description']}"
-                        else:
-                            cleaned["description"] = value
-                    # Simply skip other unsupported fields
-                    continue
-                # Recursively process nested schemas
-                elif isinstance(value, dict):
-                    cleaned[key] = self._clean_json_schema(value)
-                # Process arrays that might contain schemas
-                elif isinstance(value, list):
-                    cleaned_list = []
-                    for item in value:
-                        if isinstance(item, dict):
-                            cleaned_list.append(self._clean_json_schema(item))
-                        else:
-                            cleaned_list.append(item)
-                    cleaned[key] = cleaned_list
-                # Keep other values as they are
-                else:
-                    cleaned[key] = value
-                    
-            return cleaned
+    async def processToolsForGemini(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Convert the server's tools to Gemini function declarations.
+
+        Uses the tool list fetched at connect time (kept current by
+        tools/list_changed notifications) unless refresh is set.
+        """
+        if refresh:
+            await self.refresh_tools()
+        with tracer.span("schema.convert", server=self.server_name, tools=len(self.tools)):
+            return self._convert_tools_for_gemini(self.tools)
+
+    def _convert_tools_for_gemini(self, tools) -> List[Dict[str, Any]]:
+        """Build a Gemini function declaration from each MCP tool's input schema"""
+        return [schema_compiler.declaration(tool.name, tool.description, getattr(tool, "inputSchema", None))
+                for tool in tools]
+
+    def deadline_for(self, tool_name: str) -> float:
+        """Seconds a call of the tool may take: timeoutFactor x the p99 of its recent successful calls,
+        within the configured bounds"""
+        latency = self.tool_latency.get(tool_name)
+        if latency is None or latency.successes < self.timeout_min_samples:
+            return self.call_timeout
+        return min(max(latency.percentile(99) * self.timeout_factor, self.min_call_timeout), self.call_timeout)
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any]):
+        """Call a tool on the least busy of the server's sessions, within its deadline.
+
+        At most maxResultChars characters of the result are kept; a streaming
+        tool's result is read as it arrives and the call is cancelled at that
+        point, so the rest is never held in memory. Raises CircuitOpenError
+        without calling the server while its circuit breaker is open.
+        """
+        if tool_name in self.streaming_tools:
+            stream = self.stream_tool(tool_name, tool_args)
+            result = await stream.collect(self.max_result_chars)
+            print(f"Read {stream.chars} characters of {tool_name} in {stream.chunks} chunks")
+            return result
+        return cap_result(await self._call_tool(tool_name, tool_args), self.max_result_chars)
+
+    def stream_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> ResultStream:
+        """Call a tool and read its result as an async iterator of text chunks, see ResultStream"""
+        return ResultStream(lambda on_progress: self._call_tool(tool_name, tool_args, on_progress))
+
+    async def _send_call(self, session, tool_name: str, tool_args: Dict[str, Any],
+                         progress_callback: Optional[ProgressCallback]):
+        # ClientSession keeps no public record of request ids, so peek at the next one it will use.
+        # This is the id of the call below because nothing awaits in between: awaiting call_tool
+        # runs straight into send_request, which takes _request_id before its first await.
+        request_id = getattr(session, "_request_id", None)
+        try:
+            return await session.call_tool(tool_name, tool_args, progress_callback=progress_callback)
+        except asyncio.CancelledError:
+            if request_id is not None:
+                # Timed out or no longer wanted: tell the server to stop working on it
+                self._run_in_background(self._send_cancel(session, request_id), f"cancel request {request_id}")
+            raise
+
+    async def _send_cancel(self, session, request_id: int) -> None:
+        try:
+            await session.send_notification(types.ClientNotification(types.CancelledNotification(
+                params=types.CancelledNotificationParams(requestId=request_id, reason="Cancelled by the host"))))
+        except Exception as e:
+            # A lost session has nothing left to cancel
+            if not is_connection_error(e):
+                print(f"Could not cancel request {request_id} on '{self.server_name}': {str(e) or type(e).__name__}")
+
+    async def _call_tool(self, tool_name: str, tool_args: Dict[str, Any],
+                         progress_callback: Optional[ProgressCallback] = None):
+        self.breaker.check()
+        timeout = self.deadline_for(tool_name)
+        start_time = time.perf_counter()
+        outcome = None
+        try:
+            if not self.pool.members:
+                # A replayed client has a stand-in session and no connection
+                result = await asyncio.wait_for(
+                    self._send_call(self.session, tool_name, tool_args, progress_callback), timeout=timeout)
+            else:
+                async with self.pool.acquire() as session:
+                    result = await asyncio.wait_for(
+                        self._send_call(session, tool_name, tool_args, progress_callback), timeout=timeout)
+            outcome = True
+            return result
+        except asyncio.TimeoutError:
+            outcome = False
+            raise TimeoutError(f"{tool_name} on '{self.server_name}' did not finish within {timeout:.1f}s")
+        except asyncio.CancelledError:
+            # The caller gave up, which says nothing about the server
+            raise
+        except Exception:
+            outcome = False
+            raise
+        finally:
+            if outcome is not None:
+                seconds = time.perf_counter() - start_time
+                latency = self.tool_latency.get(tool_name)
+                if latency is None:
+                    latency = self.tool_latency[tool_name] = RollingHistogram(self.breaker.window)
+                latency.record(seconds, outcome)
+                self.breaker.record(seconds, outcome)
+
+    async def _ping(self) -> None:
+        if self.session is None:
+            raise ConnectionError(f"Server '{self.server_name}' is not connected")
+        await asyncio.wait_for(self.session.send_ping(), timeout=self.min_call_timeout)
+
+    async def _probe(self) -> None:
+        """Half-open check of the circuit breaker: ping the server, reopening the session if it stopped answering.
+
+        The SSE client stops sending once a request has timed out on a stalled
+        server, so a server that recovers still can't be reached on the old session.
+        """
+        try:
+            await self._ping()
+        except Exception as e:
+            if not self.can_reconnect():
+                raise
+            print(f"[circuit] '{self.server_name}' did not answer a ping ({str(e) or type(e).__name__}), "
+                  f"reopening its session")
+            await self.reconnect()
+            await self._ping()
+
+    def call_stats(self) -> Dict[str, Any]:
+        """Recent latency, error rate and current deadline of each tool called"""
+        return {tool_name: {**latency.summary(), "deadline_s": self.deadline_for(tool_name)}
+                for tool_name, latency in self.tool_latency.items()}
 
     async def callTool(self, tool_name: str, tool_args: Dict[str, Any]) -> Dict[str, Any]:
         """Call a tool with the given name and arguments"""
@@ -0,0 +1,161 @@
+import json
+import itertools
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple
+
+import mcp.types as types
+
+FETCH_TOOL_NAME = "fetch_tool_result"
+
+FETCH_TOOL_DECLARATION = {
+    "name": FETCH_TOOL_NAME,
+    "description": "Fetch more of a large tool result that was shortened in the conversation. "
+                   "Use the handle given in the shortened result.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "handle": {"type": "string", "description": "Handle of the stored result, e.g. result-3"},
+            "offset": {"type": "integer", "description": "Character offset to start reading from"},
+            "length": {"type": "integer", "description": "Number of characters to read"},
+        },
+        "required": ["handle"],
+    },
+}
+
+# Follow-up messages carrying tool results end with this, see MCPHost._execute_tool_chain
+RESULT_MESSAGE_MARKER = "Based on these results"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count; about four characters per token for English and JSON"""
+    return (len(text) + 3) // 4
+
+
+class ContextCompactor:
+    """Keeps tool results within a token budget before they are sent to the LLM.
+
+    Results that don't fit their share of tokenBudget are shortened to a
+    preview and the full text is kept host-side under a handle the LLM can read
+    with the fetch_tool_result tool. Tool results from older turns are dropped
+    from the chat history, keeping only the keepRecentResults most recent ones.
+
+    Settings come from the "compaction" section of config.json:
+    - enabled (default true)
+    - tokenBudget: tokens for all results of one turn together (default 8000)
+    - keepRecentResults: tool result messages kept verbatim in history (default 2)
+    - maxHandles: stored full results, least recently used dropped first (default 64)
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.token_budget = 8000
+        self.keep_recent_results = 2
+        self.max_handles = 64
+        self._handles: "OrderedDict[str, str]" = OrderedDict()
+        self._handle_ids = itertools.count(1)
+        self.stats = {"compacted": 0, "pruned": 0, "tokens_saved": 0}
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the compaction settings from config.json"""
+        self.enabled = bool(settings.get('enabled', True))
+        self.token_budget = int(settings.get('tokenBudget', self.token_budget))
+        self.keep_recent_results = int(settings.get('keepRecentResults', self.keep_recent_results))
+        self.max_handles = int(settings.get('maxHandles', self.max_handles))
+
+    def _store(self, text: str) -> str:
+        handle = f"result-{next(self._handle_ids)}"
+        self._handles[handle] = text
+        while len(self._handles) > self.max_handles:
+            self._handles.popitem(last=False)
+        return handle
+
+    @staticmethod
+    def _preview(text: str, max_tokens: int) -> str:
+        """Shortened form of a result: a structural summary for JSON, head and tail for text"""
+        max_chars = max(max_tokens * 4, 200)
+        try:
+            value = json.loads(text)
+        except (json.JSONDecodeError, TypeError):
+            value = None
+        if isinstance(value, list):
+            header = f"JSON list of {len(value)} items, first items: "
+            return header + json.dumps(value, separators=(",", ":"))[:max_chars - len(header)]
+        if isinstance(value, dict):
+            header = f"JSON object with keys {list(value)[:20]}: "
+            return header + json.dumps(value, separators=(",", ":"))[:max_chars - len(header)]
+        head = max_chars * 2 // 3
+        tail = max_chars - head
+        return f"{text[:head]}\n...\n{text[-tail:]}"
+
+    def compact(self, results: List[Tuple[str, str]]) -> List[str]:
+        """Fit (tool name, result text) pairs into the token budget.
+
+        Small results are kept whole and the tokens they leave unused go to the
+        larger ones; anything still too large becomes a preview plus a handle.
+        """
+        if not self.enabled or not results:
+            return [text for _, text in results]
+
+        sizes = [estimate_tokens(text) for _, text in results]
+        allowance = {}
+        remaining_budget = self.token_budget
+        pending = sorted(range(len(results)), key=lambda i: sizes[i])
+        while pending:
+            share = remaining_budget // len(pending)
+            index = pending.pop(0)
+            allowance[index] = min(sizes[index], max(share, 0))
+            remaining_budget -= allowance[index]
+
+        compacted = []
+        for index, (tool_name, text) in enumerate(results):
+            if sizes[index] <= allowance[index]:
+                compacted.append(text)
+                continue
+            handle = self._store(text)
+            shortened = (f"[Result shortened from about {sizes[index]} tokens; call {FETCH_TOOL_NAME} with "
+                         f"handle '{handle}' to read the full {len(text)} characters]\n"
+                         f"{self._preview(text, allowance[index])}")
+            saved = sizes[index] - estimate_tokens(shortened)
+            self.stats["compacted"] += 1
+            self.stats["tokens_saved"] += max(saved, 0)
+            print(f"[compaction] {tool_name}: stored as {handle}, {sizes[index]} -> "
+                  f"{estimate_tokens(shortened)} tokens (saved {saved})")
+            compacted.append(shortened)
+        return compacted
+
+    def fetch(self, args: Dict[str, Any]) -> types.CallToolResult:
+        """Serve a fetch_tool_result call from the stored results"""
+        handle = str(args.get("handle", ""))
+        text = self._handles.get(handle)
+        if text is None:
+            return types.CallToolResult(
+                content=[types.TextContent(type="text", text=f"Unknown or expired handle '{handle}'")],
+                isError=True)
+        self._handles.move_to_end(handle)
+        offset = max(int(args.get("offset") or 0), 0)
+        length = int(args.get("length") or self.token_budget * 2)
+        chunk = text[offset:offset + length]
+        return types.CallToolResult(content=[types.TextContent(
+            type="text", text=f"[{handle} characters {offset}-{offset + len(chunk)} of {len(text)}]\n{chunk}")])
+
+    def prune_history(self, chat) -> int:
+        """Replace tool results in older chat turns with a short note; returns tokens saved"""
+        if not self.enabled:
+            return 0
+        history = getattr(chat, "history", None) or []
+        result_messages = [
+            part for content in history if content.role == "user"
+            for part in content.parts if part.text and RESULT_MESSAGE_MARKER in part.text
+        ]
+        saved = 0
+        for part in result_messages[:max(len(result_messages) - self.keep_recent_results, 0)]:
+            tool_names = [line.split(" ")[1] for line in part.text.split("\n") if line.startswith("Tool ")]
+            note = f"[Earlier tool results dropped to save context: {', '.join(tool_names)}]"
+            tokens = estimate_tokens(part.text) - estimate_tokens(note)
+            part.text = note
+            saved += tokens
+        if saved:
+            self.stats["pruned"] += 1
+            self.stats["tokens_saved"] += saved
+            print(f"[compaction] dropped stale tool results from history (saved {saved} tokens)")
+        return saved
@@ -4,22 +4,68 @@ import sys
 import os
 import time
 import asyncio
+import contextvars
 import re
+import threading
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 from google.generativeai import GenerativeModel 
 import google.generativeai as genai  
+import uvicorn
 from client import MCPClient
+from api import APIServer
+from tool_cache import ToolResultCache
+from tool_retrieval import ToolIndex, ToolSelection
+from tracing import tracer
+from recording import TrafficRecorder
+from supervisor import ServerSupervisor, is_connection_error
+from manifests import ManifestCache
+from compaction import ContextCompactor, FETCH_TOOL_NAME, FETCH_TOOL_DECLARATION, RESULT_MESSAGE_MARKER
+from planner import (DAGExecutor, PLAN_PROMPT, REPLAN_PROMPT, ANSWER_PROMPT,
+                     describe_tools, parse_plan, result_to_text)
 from dotenv import load_dotenv
 import traceback
 
 load_dotenv()  # load environment variables from .env
 
+# Event queue of the query running in the current task, see MCPHost.process_query_events
+_query_events: contextvars.ContextVar[Optional[asyncio.Queue]] = contextvars.ContextVar("query_events", default=None)
+
+
+class ToolNotFoundError(LookupError):
+    """A tool call named a tool that no connected server provides"""
+
+
 class MCPHost:
-    def __init__(self, config_path: str = "config.json"):
+    def __init__(self, config_path: str = "config.json", recording: Optional[Dict[str, Any]] = None):
         self.config_path = config_path
-        self.mcp_clients: Dict[str, SSEClient] = {}
+        self.mcp_clients: Dict[str, MCPClient] = {}
         self.all_tools = []
+        # Tool name -> {"server", "client", "tool"}, maintained by register/unregister_server_tools
+        self.tool_routes: Dict[str, Dict[str, Any]] = {}
+        self.tool_collisions: Dict[str, List[str]] = {}
+        # Server name -> (tools_version, Gemini function declarations)
+        self._declaration_cache: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+        self.host_settings: Dict[str, Any] = {}
+        self.startup_report: Dict[str, Dict[str, Any]] = {}
+        self._background_tasks = set()
+        self._tools_loaded = False
+        self._tool_call_semaphore: Optional[asyncio.Semaphore] = None
+        self._query_semaphore: Optional[asyncio.Semaphore] = None
+        self._query_tasks = set()
+        self._input_queue: Optional[asyncio.Queue] = None
+        self.tool_cache = ToolResultCache()
+        self.compactor = ContextCompactor()
+        self._tool_index: Optional[ToolIndex] = None
+        self._tool_index_key = None
+        self.recorder = TrafficRecorder()
+        self.supervisor = ServerSupervisor(self)
+        self.manifests = ManifestCache()
+        # One lock per lazy server, so concurrent first calls share a single start
+        self._start_locks: Dict[str, asyncio.Lock] = {}
+        self._idle_task: Optional[asyncio.Task] = None
+        # Recording settings from the command line, overriding config.json
+        self._recording_override = recording or {}
         genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
         self.model = GenerativeModel(os.environ.get("MODEL_NAME", "gemini-1.5-flash"))
 
@@ -28,6 +74,16 @@ class MCPHost:
         try:
             with open(self.config_path, 'r') as f:
                 config = json.load(f)
+            # Everything outside mcpServers is a host-level setting
+            self.host_settings = {k: v for k, v in config.items() if k != 'mcpServers'}
+            self.tool_cache.configure(self.host_settings.get('toolCache', {}), config.get('mcpServers', {}))
+            self.compactor.configure(self.host_settings.get('compaction', {}))
+            tracer.configure(self.host_settings.get('tracing', {}))
+            self.supervisor.configure(self.host_settings.get('supervisor', {}))
+            self.manifests.configure(self.host_settings)
+            self.recorder.configure({**self.host_settings.get('recording', {}), **self._recording_override})
+            if self.recorder.replaying:
+                self.model = self.recorder.replay_model()
             return config.get('mcpServers', {})
         except FileNotFoundError:
             print(f"Error: Configuration file '{self.config_path}' not found.")
@@ -41,20 +97,140 @@ class MCPHost:
 
         for server_name in self.mcp_clients.keys():
             print(f"Loading tools from {server_name}")
-
-            client = self.mcp_clients[server_name]
-            self.all_tools.extend(client.tools)
+            self.register_server_tools(server_name)
             #print(f"Loaded {self.all_tools} tools")
+        self._tools_loaded = True
+
+    @staticmethod
+    def _tool_name(tool) -> str:
+        """Name of an MCP tool object or tool dict"""
+        return getattr(tool, "name", tool.get("name") if isinstance(tool, dict) else "unknown")
+
+    def register_server_tools(self, server_name: str) -> None:
+        """Add (or refresh) the routes for every tool of a server.
+
+        The first server to register a tool name owns it; later servers
+        exposing the same name are recorded in tool_collisions and take over
+        the route if the owner is removed or stops serving the name.
+        """
+        client = self.mcp_clients[server_name]
+        served = {self._tool_name(tool): tool for tool in client.tools}
+        for tool_name in list(self.tool_routes):
+            if tool_name not in served and self.tool_routes[tool_name]["server"] == server_name:
+                self._release_tool_name(tool_name, server_name, reassign=True)
+        for tool_name in list(self.tool_collisions):
+            if tool_name not in served:
+                self._forget_owner(tool_name, server_name)
+
+        for tool_name, tool in served.items():
+            route = self.tool_routes.get(tool_name)
+            if route and route["server"] != server_name:
+                owners = self.tool_collisions.setdefault(tool_name, [route["server"]])
+                if server_name not in owners:
+                    owners.append(server_name)
+                    print(f"Warning: Tool '{tool_name}' from '{server_name}' collides with "
+                          f"'{route['server']}', keeping '{route['server']}'")
+                continue
+            self.tool_routes[tool_name] = {"server": server_name, "client": client, "tool": tool}
+        self.all_tools = [route["tool"] for route in self.tool_routes.values()]
+        self.recorder.record_tools(server_name, client.tools)
+        if client.lazy and client.session is not None:
+            # A live lazy server: keep its manifest current for the next startup
+            self.manifests.save(server_name, client.server_config, client.tools, client.server_info)
+
+    def unregister_server_tools(self, server_name: str, reassign: bool = True) -> None:
+        """Remove the routes of a server, handing colliding tool names to the next server."""
+        for tool_name in [name for name, route in self.tool_routes.items() if route["server"] == server_name]:
+            self._release_tool_name(tool_name, server_name, reassign)
+        for tool_name in list(self.tool_collisions):
+            self._forget_owner(tool_name, server_name)
+        self.all_tools = [route["tool"] for route in self.tool_routes.values()]
+
+    def _release_tool_name(self, tool_name: str, server_name: str, reassign: bool) -> None:
+        """Drop a server's route for a tool name, letting the next server that serves it take over."""
+        del self.tool_routes[tool_name]
+        # Servers that lost the collision first, in the order they registered, then any other
+        candidates = self.tool_collisions.get(tool_name, []) + list(self.mcp_clients)
+        self._forget_owner(tool_name, server_name)
+        if not reassign:
+            return
+        for other_name in candidates:
+            if other_name == server_name or other_name not in self.mcp_clients:
+                continue
+            other = self.mcp_clients[other_name]
+            tool = next((t for t in other.tools if self._tool_name(t) == tool_name), None)
+            if tool is not None:
+                self.tool_routes[tool_name] = {"server": other_name, "client": other, "tool": tool}
+                print(f"Tool '{tool_name}' is now served by '{other_name}'")
+                return
+
+    def _forget_owner(self, tool_name: str, server_name: str) -> None:
+        """Take a server out of a tool name's collision record, dropping records left with one server."""
+        owners = [owner for owner in self.tool_collisions.get(tool_name, []) if owner != server_name]
+        if len(owners) > 1:
+            self.tool_collisions[tool_name] = owners
+        else:
+            self.tool_collisions.pop(tool_name, None)
+
+    async def get_function_declarations(self) -> List[Dict[str, Any]]:
+        """Gemini function declarations for all routed tools, rebuilt only when a server's tools change"""
+        all_available_functions = []
+        for server_name, client in list(self.mcp_clients.items()):
+            cached = self._declaration_cache.get(server_name)
+            if cached is None or cached[0] != client.tools_version:
+                version = client.tools_version
+                declarations = await client.processToolsForGemini()
+                self._declaration_cache[server_name] = (version, declarations)
+                print(f"Available functions from {server_name}: {len(declarations)} (tools version {version})")
+                if cached is not None and self._tools_loaded:
+                    # The tool list changed (restart or list_changed), so refresh the routes too
+                    self.register_server_tools(server_name)
+            if not client.breaker.allows_calls:
+                print(f"Hiding the tools of '{server_name}' while its circuit is {client.breaker.state}")
+            elif client.attached and client.session is None and not client.lazy:
+                print(f"Hiding the tools of '{server_name}' until it is reachable again")
+            else:
+                # A tool name served by several servers is declared once, by the server that owns its route
+                all_available_functions.extend(
+                    declaration for declaration in self._declaration_cache[server_name][1]
+                    if self.tool_routes.get(declaration["name"], {}).get("server") == server_name)
+
+        for server_name in list(self._declaration_cache):
+            if server_name not in self.mcp_clients:
+                del self._declaration_cache[server_name]
+        if self.compactor.enabled:
+            # Host-side tool for reading results that were shortened to fit the context
+            all_available_functions.append(FETCH_TOOL_DECLARATION)
+        return all_available_functions
+
+    async def select_tools(self, query: str) -> ToolSelection:
+        """Pick the tools most relevant to a query with a local BM25 index.
+
+        Controlled by the top-level "toolSelection" section of config.json
+        ({"enabled": true, "topK": 8}); with fewer tools than topK every tool is shown.
+        """
+        settings = self.host_settings.get('toolSelection', {})
+        top_k = int(settings.get('topK', 8))
+        functions = [f for f in await self.get_function_declarations() if f["name"] != FETCH_TOOL_NAME]
+        if not settings.get('enabled', True) or len(functions) <= top_k:
+            return ToolSelection(set())
+
+        # The index only changes when some server's tool list does
+        index_key = tuple(f["name"] for f in functions)
+        if index_key != self._tool_index_key:
+            self._tool_index = ToolIndex(functions)
+            self._tool_index_key = index_key
+        with tracer.span("tool_selection", tools=len(functions)):
+            selected = self._tool_index.search(query, top_k)
+        print(f"Selected {len(selected)} of {len(functions)} tools for the query: {selected}")
+        return ToolSelection(set(selected), always={FETCH_TOOL_NAME})
 
     def get_client_for_tool(self, tool_name: str) -> MCPClient:
         """Get the client for a given tool name"""
-        for server_name in self.mcp_clients.keys():
-            client = self.mcp_clients[server_name]
-            for t in client.tools:
-                current_tool_name = getattr(t, "name", t.get("name") if isinstance(t, dict) else "unknown")
-                if tool_name == current_tool_name:
-                    return client               
-                    
+        route = self.tool_routes.get(tool_name)
+        if route:
+            return route["client"]
+
         print(f"Warning: No client found for tool '{tool_name}'")
         return None
 
@@ -130,6 +306,9 @@ class MCPHost:
     def process_llm_candidate(self, candidate):
         """
         Process the LLM candidate response and convert it to a manageable format.
+
+        Returns the list of every function call in the candidate if there is
+        at least one, otherwise the first usable text part.
         """
         try:
             #print("Starting to process candidate")
@@ -137,6 +316,8 @@ class MCPHost:
                 print("Invalid candidate structure")
                 return None
 
+            function_calls = []
+            text_response = None
             for part in candidate.content.parts:
                 #print(f"Processing part in candidate")
                 json_part = self.convert_part_to_json(part)
@@ -151,11 +332,17 @@ class MCPHost:
                     if "sorry" in text.lower() or "cannot" in text.lower():
                         print("Skipping this tool")
                         continue
-                    return text
+                    if text_response is None:
+                        text_response = text
 
                 if json_part['type'] == 'function_call':
                     print(f"Found valid function call: {json_part}")
-                    return json_part
+                    function_calls.append(json_part)
+
+            if function_calls:
+                return function_calls
+            if text_response is not None:
+                return text_response
 
             print("No valid parts found in candidate")
             return None
@@ -164,20 +351,95 @@ class MCPHost:
             print(f"Error processing candidate: {str(e)}")
             return None
 
-    async def process_query(self, query: str) -> Dict[str, Any]:
-        """Process a query using Gemini and available tools"""
+    def _emit(self, event_type: str, **data) -> None:
+        """Publish a progress event to the query running in this task, if anyone is listening"""
+        queue = _query_events.get()
+        if queue is not None:
+            queue.put_nowait({"type": event_type, **data})
+
+    async def _send_message(self, chat, content, stream: bool = True, **kwargs):
+        """Send a message to the chat, streaming text deltas out as events.
+
+        Returns the complete response once the stream is exhausted, so callers
+        can read its candidates exactly as with a non-streamed call.
+        """
+        with tracer.span("llm", stream=stream, prompt_chars=len(str(content)),
+                         tools=sum(len(t.get("function_declarations", [])) for t in kwargs.get("tools") or [])) as span:
+            start_ns = time.perf_counter_ns()
+            response = await chat.send_message_async(content, stream=stream, **kwargs)
+            chunks = []
+            if stream:
+                first_chunk = True
+                async for chunk in response:
+                    if first_chunk:
+                        span.set(first_chunk_ms=(time.perf_counter_ns() - start_ns) / 1e6)
+                        first_chunk = False
+                    if self.recorder.recording:
+                        chunks.append(((time.perf_counter_ns() - start_ns) / 1e9, chunk.candidates[0].content
+                                       if getattr(chunk, 'candidates', None) else None))
+                    for candidate in getattr(chunk, 'candidates', None) or []:
+                        for part in getattr(candidate.content, 'parts', []):
+                            if getattr(part, 'text', None):
+                                self._emit("text", text=part.text)
+            self.recorder.record_llm(content, kwargs.get("generation_config"),
+                                     (time.perf_counter_ns() - start_ns) / 1e9, chunks, response)
+        return response
+
+    async def process_query_events(self, query: str, chat=None) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query, yielding progress events as they happen.
+
+        Events are dicts with a "type" of "text" (an LLM text delta),
+        "tool_started", "tool_finished" (with "seconds" and "error") and finally
+        "final" carrying the same text process_query returns.
+        """
+        queue = asyncio.Queue()
+        # The task copies the current context, so only this query sees the queue
+        token = _query_events.set(queue)
+        try:
+            task = asyncio.create_task(self.process_query(query, chat))
+        finally:
+            _query_events.reset(token)
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {"type": "final", "text": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def process_query(self, query: str, chat=None) -> Dict[str, Any]:
+        """Process a query using Gemini and available tools.
+
+        Pass an existing chat to continue a conversation; otherwise a fresh
+        chat session is started for the query.
+        """
+        if chat is None:
+            chat = self.model.start_chat(history=[])
+        mode = self.host_settings.get('executionMode', 'chain')
+        with tracer.span("query", mode=mode, query=query[:100]) as span:
+            if mode == 'dag':
+                response = await self._process_query_dag(query, chat)
+            else:
+                response = await self._process_query_chain(query, chat)
+        if tracer.enabled and tracer.print_summary:
+            print(f"\nLatency breakdown:\n{tracer.format_summary(span.trace)}")
+        return response
+
+    async def _process_query_chain(self, query: str, chat) -> str:
+        """Process a query by letting the LLM call tools one turn at a time"""
         # First, collect all available tools from all clients
-        all_available_functions = []
-        for server_name, client in self.mcp_clients.items():
-            client_functions = await client.processToolsForGemini()
-            print(f"Available functions from {server_name}: {len(client_functions)}")
-            all_available_functions.extend(client_functions)
+        all_available_functions = await self.get_function_declarations()
+        selection = await self.select_tools(query)
+        selected_functions = selection.filter(all_available_functions)
         
-        print(f"Total available functions: {len(all_available_functions)}")
+        print(f"Total available functions: {len(all_available_functions)}, sending {len(selected_functions)}")
         
         # Format messages for Gemini with planning approach
-        chat = self.model.start_chat(history=[])
-        
         try:
             # Create a plan using all available tools
             planning_prompt = f"""Given the following task: '{query}', please follow these steps:
@@ -186,10 +448,11 @@ class MCPHost:
 3. Chain the tool calls in the order they should be executed, ensuring that the output of one tool can be used as input for the next where applicable.
 4. Instead of describing the plan in text, execute it directly by calling the first tool."""
 
-            llm_response = await chat.send_message_async(
+            llm_response = await self._send_message(
+                chat,
                 planning_prompt,
                 generation_config={"temperature": 0.0},
-                tools=[{"function_declarations": all_available_functions}]
+                tools=[{"function_declarations": selected_functions}]
             )
             
             # Process response and handle tool calls
@@ -206,34 +469,36 @@ class MCPHost:
                         final_text.append(processed_response)
                         
                         # Try to extract tool names from the plan
-                        plan_tools = self._extract_tools_from_plan(processed_response, all_available_functions)
+                        plan_tools = self._extract_tools_from_plan(processed_response, selected_functions)
                         
                         if plan_tools:
                             # If we identified tools in the plan, ask LLM to execute the first one
                             print(f"Identified tools in plan: {plan_tools}")
+                            selection.mark_used(plan_tools)
                             first_tool_prompt = f"""Based on your plan:
 
 {processed_response}
 
 Please execute the first step by calling the appropriate tool function now."""
 
-                            first_tool_response = await chat.send_message_async(
+                            first_tool_response = await self._send_message(
+                                chat,
                                 first_tool_prompt,
                                 generation_config={"temperature": 0.0},
-                                tools=[{"function_declarations": all_available_functions}]
+                                tools=[{"function_declarations": selected_functions}]
                             )
                             
                             if hasattr(first_tool_response, 'candidates') and first_tool_response.candidates:
                                 for tool_candidate in first_tool_response.candidates:
-                                    tool_call = self.process_llm_candidate(tool_candidate)
-                                    if isinstance(tool_call, dict) and tool_call['type'] == 'function_call':
-                                        print(f"Extracted first tool call: {tool_call}")
-                                        await self._execute_tool_chain(chat, tool_call, final_text, tool_results)
+                                    tool_calls = self.process_llm_candidate(tool_candidate)
+                                    if isinstance(tool_calls, list):
+                                        print(f"Extracted first tool calls: {tool_calls}")
+                                        await self._execute_tool_chain(chat, tool_calls, final_text, tool_results, selection)
                                         break
                     
-                    elif isinstance(processed_response, dict) and processed_response['type'] == 'function_call':
-                        # Begin executing the plan with sequential tool calls
-                        await self._execute_tool_chain(chat, processed_response, final_text, tool_results)
+                    elif isinstance(processed_response, list):
+                        # Begin executing the plan, one batch of tool calls per turn
+                        await self._execute_tool_chain(chat, processed_response, final_text, tool_results, selection)
             else:
                 print(f"No candidates found in response {llm_response}")
                 return "No response generated for your query."
@@ -245,44 +510,208 @@ Please execute the first step by calling the appropriate tool function now."""
 
         return "\n".join(final_text)
         
-    async def _execute_tool_chain(self, chat, initial_tool_call, final_text, tool_results):
-        """Execute a chain of tool calls, passing outputs as inputs when needed"""
-        current_tool_call = initial_tool_call
+    async def _call_tool(self, tool_name: str, tool_args: Dict[str, Any]):
+        """Route a tool call to the server that owns the tool.
+
+        Results of tools opted into caching are served from tool_cache, and
+        successful calls evict any cached reads they make stale.
+        """
+        if tool_name == FETCH_TOOL_NAME:
+            return self.compactor.fetch(tool_args)
+
+        client = self.get_client_for_tool(tool_name)
+        print(f"Client identified: {client}")
+        if not client:
+            raise ToolNotFoundError(f"No client found for tool {tool_name}")
+        server_name = self.tool_routes[tool_name]["server"]
+
+        with tracer.span("tool", tool=tool_name, server=server_name) as span:
+            self._emit("tool_started", tool=tool_name, args=tool_args)
+            start_time = time.perf_counter()
+            cached = self.tool_cache.get(server_name, tool_name, tool_args)
+            span.set(cached=cached is not None)
+            if cached is not None:
+                print(f"Cache hit for {tool_name} with args {tool_args}")
+                self._emit("tool_finished", tool=tool_name, seconds=time.perf_counter() - start_time, error="",
+                           cached=True)
+                return cached
+
+            print(f"EXECUTING NOW!!, tool_name: {tool_name}, tool_args: {tool_args}")
+            error = ""
+            try:
+                result = await self._call_server_tool(client, server_name, tool_name, tool_args)
+                self.recorder.record_tool(server_name, tool_name, tool_args, result, time.perf_counter() - start_time)
+                if not getattr(result, "isError", False):
+                    self.tool_cache.put(server_name, tool_name, tool_args, result)
+                    evicted = self.tool_cache.invalidate_for(tool_name, tool_args)
+                    if evicted:
+                        print(f"{tool_name} invalidated {evicted} cached results")
+                return result
+            except Exception as e:
+                error = str(e)
+                self.recorder.record_tool(server_name, tool_name, tool_args, None, time.perf_counter() - start_time,
+                                          error=error or type(e).__name__)
+                raise
+            finally:
+                if cached is None:
+                    self._emit("tool_finished", tool=tool_name, seconds=time.perf_counter() - start_time,
+                               error=error, cached=False)
+
+    def is_idempotent(self, server_name: str, tool_name: str) -> bool:
+        """Whether a tool can safely be called again: annotated read-only or idempotent by its server,
+        listed in the server's "idempotentTools", or opted into result caching"""
+        route = self.tool_routes.get(tool_name)
+        annotations = getattr(route["tool"], "annotations", None) if route else None
+        if annotations and (annotations.readOnlyHint or annotations.idempotentHint):
+            return True
+        client = self.mcp_clients.get(server_name)
+        if client and tool_name in client.server_config.get('idempotentTools', []):
+            return True
+        return self.tool_cache.ttl_for(server_name, tool_name) is not None
+
+    async def _call_server_tool(self, client: MCPClient, server_name: str, tool_name: str, tool_args: Dict[str, Any]):
+        """call_tool on a server; idempotent calls cut off by a lost connection are retried once the
+        supervisor has the server back"""
+        retries = 0
+        while True:
+            client.in_flight += 1
+            try:
+                if client.lazy and (client.session is None or self._start_lock(server_name).locked()):
+                    await self.ensure_server_started(server_name)
+                if client.session is None:
+                    raise ConnectionError(f"Server '{server_name}' is not connected")
+                return await client.call_tool(tool_name, tool_args)
+            except Exception as e:
+                if not is_connection_error(e) or retries >= self.supervisor.retries or \
+                        not self.supervisor.running or not self.is_idempotent(server_name, tool_name):
+                    raise
+                retries += 1
+                print(f"Connection to '{server_name}' lost during {tool_name}, retrying once it is back")
+                if not await self.supervisor.wait_until_healthy(server_name):
+                    raise
+            finally:
+                client.in_flight -= 1
+                client.last_used = time.monotonic()
+
+    def _start_lock(self, server_name: str) -> asyncio.Lock:
+        return self._start_locks.setdefault(server_name, asyncio.Lock())
+
+    async def ensure_server_started(self, server_name: str) -> MCPClient:
+        """Start a lazy server that was advertised from its manifest (or stopped while idle)"""
+        client = self.mcp_clients[server_name]
+        async with self._start_lock(server_name):
+            if client.session is not None:
+                return client
+            timeout = float(client.server_config.get('startupTimeout', self.host_settings.get('startupTimeout', 60)))
+            print(f"Starting server '{server_name}' on first use")
+            start_time = time.perf_counter()
+            advertised = {self._tool_name(tool) for tool in client.tools}
+            try:
+                await asyncio.wait_for(client.restart(), timeout=timeout)
+            except asyncio.TimeoutError:
+                await client.stop_server()
+                raise ConnectionError(f"Server '{server_name}' not ready after {timeout:.0f}s")
+            except Exception as e:
+                raise ConnectionError(f"Server '{server_name}' failed to start: {e}")
+            client.last_used = time.monotonic()
+            self.startup_report[server_name].update(status="ready", seconds=time.perf_counter() - start_time,
+                                                    ready=client.startup_metrics["ready"], tools=len(client.tools))
+            if {self._tool_name(tool) for tool in client.tools} != advertised:
+                print(f"Tools of '{server_name}' differ from its manifest, updating")
+            self.register_server_tools(server_name)
+            print(f"Server '{server_name}' started in {time.perf_counter() - start_time:.2f}s")
+        return client
+
+    async def _stop_idle_servers(self) -> None:
+        """Stop lazy servers that have had no calls for their idleTimeout; they restart on the next call"""
+        timeouts = [c.idle_timeout for c in self.mcp_clients.values() if c.lazy and c.idle_timeout > 0]
+        interval = min(max(min(timeouts) / 4, 0.5), 30.0)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for server_name, client in list(self.mcp_clients.items()):
+                if not client.lazy or client.idle_timeout <= 0 or client.session is None or client.in_flight:
+                    continue
+                if now - client.last_used < client.idle_timeout:
+                    continue
+                async with self._start_lock(server_name):
+                    if client.in_flight or client.session is None:
+                        continue
+                    print(f"\nStopping server '{server_name}' after {client.idle_timeout:.0f}s without calls")
+                    await client.stop_server()
+                    self.startup_report[server_name]["status"] = "idle"
+
+    async def _execute_tool_calls(self, tool_calls: List[Dict[str, Any]]) -> List[Any]:
+        """Run independent tool calls concurrently, bounded by maxParallelToolCalls.
+
+        Returns one entry per call, in order: the tool result or the exception it raised.
+        """
+        if self._tool_call_semaphore is None:
+            self._tool_call_semaphore = asyncio.Semaphore(int(self.host_settings.get('maxParallelToolCalls', 8)))
+
+        async def _run(tool_call):
+            async with self._tool_call_semaphore:
+                return await self._call_tool(tool_call['name'], tool_call['args'])
+
+        return await asyncio.gather(*(_run(tool_call) for tool_call in tool_calls), return_exceptions=True)
+
+    async def _execute_tool_chain(self, chat, initial_tool_calls, final_text, tool_results, selection=None):
+        """Execute a chain of tool calls, passing outputs as inputs when needed.
+
+        Every function call the LLM emits in one turn runs concurrently and all
+        of their results go back to the LLM in a single follow-up message.
+        """
+        current_tool_calls = initial_tool_calls
+        selection = selection or ToolSelection(set())
         
-        while current_tool_call is not None:
-            
-            tool_name = current_tool_call['name']
-            tool_args = current_tool_call['args']
-            
-            print(f"Executing tool: {tool_name} with args: {tool_args}")
-            final_text.append(f"[Calling tool {tool_name} with args {tool_args}]")
-            
-            # Find the right client for this tool
-            client = self.get_client_for_tool(tool_name)
-            print(f"Client identified: {client}")
-            if not client:
-                final_text.append(f"[Error: No client found for tool {tool_name}]")
+        while current_tool_calls:
+            selection.mark_used(tool_call['name'] for tool_call in current_tool_calls)
+
+            for tool_call in current_tool_calls:
+                print(f"Executing tool: {tool_call['name']} with args: {tool_call['args']}")
+                final_text.append(f"[Calling tool {tool_call['name']} with args {tool_call['args']}]")
+
+            results = await self._execute_tool_calls(current_tool_calls)
+
+            result_lines = []
+            successful = [(tool_call['name'], result_to_text(tool_result))
+                          for tool_call, tool_result in zip(current_tool_calls, results)
+                          if not isinstance(tool_result, BaseException)]
+            # Large results are shortened to fit the token budget before they go into the prompt
+            with tracer.span("compaction", results=len(successful)):
+                compacted = iter(self.compactor.compact(successful))
+            for tool_call, tool_result in zip(current_tool_calls, results):
+                tool_name = tool_call['name']
+                if isinstance(tool_result, ToolNotFoundError):
+                    final_text.append(f"[Error: {tool_result}]")
+                    result_lines.append(f"Tool {tool_name} error: {tool_result}")
+                elif isinstance(tool_result, BaseException):
+                    print(f"Error executing tool {tool_name}: {str(tool_result)}")
+                    traceback.print_exception(type(tool_result), tool_result, tool_result.__traceback__)
+                    final_text.append(f"[Error executing tool {tool_name}: {str(tool_result)}]")
+                    result_lines.append(f"Tool {tool_name} error: {tool_result}")
+                else:
+                    tool_results.append({"call": tool_name, "result": tool_result})
+                    result_lines.append(f"Tool {tool_name} result: {next(compacted)}")
+
+            # Stop if nothing succeeded, there is nothing new to reason about
+            if all(isinstance(tool_result, BaseException) for tool_result in results):
                 break
-                
+
             try:
-                # Execute the tool
-                print(f"EXECUTING NOW!!, tool_name: {tool_name}, tool_args: {tool_args}")
-                
-                tool_result = await client.session.call_tool(tool_name, tool_args)
-                tool_results.append({"call": tool_name, "result": tool_result})
-                
                 # Continue conversation with tool results to get next action
-                follow_up_prompt = f"""Tool {tool_name} result: {tool_result.content}
+                self.compactor.prune_history(chat)
+                follow_up_prompt = "\n".join(result_lines) + f"""
 
-Based on this result, what is the next step in your plan? 
-If another tool needs to be called, use the appropriate function call.
+{RESULT_MESSAGE_MARKER}, what is the next step in your plan? 
+If more tools need to be called, use the appropriate function calls; independent calls can be made together.
 If no further tools are needed, provide a final response."""
 
-                follow_up_response = await chat.send_message_async(
+                follow_up_response = await self._send_message(
+                    chat,
                     follow_up_prompt,
                     generation_config={"temperature": 0.0},
-                    tools=[{"function_declarations": [tool for client in self.mcp_clients.values() 
-                                                    for tool in await client.processToolsForGemini()]}]
+                    tools=[{"function_declarations": selection.filter(await self.get_function_declarations())}]
                 )
                 
                 # Process the follow-up response
@@ -299,121 +728,428 @@ If no further tools are needed, provide a final response."""
                 if next_response is None:
                     print("No valid next step found")
                     final_text.append("[No further actions determined]")
-                    current_tool_call = None
+                    current_tool_calls = None
                 elif isinstance(next_response, str):
                     # Text response means we're done or have info to show
                     print(f"Text response received: {next_response}")
                     final_text.append(next_response)
-                    current_tool_call = None  # End the chain
-                elif isinstance(next_response, dict) and next_response['type'] == 'function_call':
-                    # Another tool call, continue the chain
+                    current_tool_calls = None  # End the chain
+                elif isinstance(next_response, list):
+                    # More tool calls, continue the chain
                     print(f"Function call response received: {next_response}")
-                    current_tool_call = next_response
+                    current_tool_calls = next_response
                 else:
                     print(f"Unexpected response type: {type(next_response)}")
                     final_text.append(f"[Unexpected response format: {next_response}]")
-                    current_tool_call = None
+                    current_tool_calls = None
                     
             except Exception as e:
-                print(f"Error executing tool {tool_name}: {str(e)}")
+                print(f"Error getting next step after tools {[c['name'] for c in current_tool_calls]}: {str(e)}")
                 traceback.print_exc()
-                final_text.append(f"[Error executing tool {tool_name}: {str(e)}]")
-                current_tool_call = None
+                final_text.append(f"[Error getting next step: {str(e)}]")
+                current_tool_calls = None
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Join the text parts of the first candidate of an LLM response"""
+        if not getattr(response, 'candidates', None):
+            return ""
+        parts = getattr(response.candidates[0].content, 'parts', [])
+        return "".join(part.text for part in parts if getattr(part, 'text', None))
+
+    def _format_step_results(self, results: Dict[str, Dict[str, Any]], statuses) -> str:
+        """Render DAG step results with the given statuses for a prompt, compacting large outputs"""
+        selected = [(step_id, result) for step_id, result in results.items() if result["status"] in statuses]
+        outputs = iter(self.compactor.compact(
+            [(result["tool"], result["output"]) for _, result in selected if result["status"] == "ok"]))
+        lines = []
+        for step_id, result in selected:
+            detail = next(outputs) if result["status"] == "ok" else f"{result['status']}: {result['error']}"
+            lines.append(f"- {step_id} = {result['tool']}({json.dumps(result['args'])}) -> {detail}")
+        return "\n".join(lines) or "(none)"
+
+    async def _process_query_dag(self, query: str, chat) -> str:
+        """Process a query by asking for the whole plan as a dependency graph of tool calls.
+
+        The graph runs with as much parallelism as its dependencies allow; the
+        LLM is only called again to replan failed steps (up to maxReplans
+        times) and once at the end to write the answer.
+        """
+        all_available_functions = await self.get_function_declarations()
+        executor = DAGExecutor(self._call_tool, int(self.host_settings.get('maxParallelToolCalls', 8)))
+        max_replans = int(self.host_settings.get('maxReplans', 2))
+        final_text = []
+
+        def _on_step(step_id, result):
+            print(f"Step {step_id} ({result['tool']}) {result['status']} {result['error']}")
+            final_text.append(f"[Step {step_id}: {result['tool']} with args {result['args']} -> {result['status']}]")
+
+        selection = await self.select_tools(query)
+        prompt = PLAN_PROMPT.format(query=query, tool_list=describe_tools(selection.filter(all_available_functions)))
+        try:
+            for attempt in range(max_replans + 1):
+                plan_response = await self._send_message(
+                    chat,
+                    prompt,
+                    generation_config={"temperature": 0.0, "response_mime_type": "application/json"},
+                    stream=False
+                )
+                plan_text = self._response_text(plan_response)
+                print(f"Plan (attempt {attempt + 1}): {plan_text}")
+                try:
+                    plan = parse_plan(plan_text, set(self.tool_routes), set(executor.outputs()))
+                except ValueError as e:
+                    print(f"Invalid plan: {e}")
+                    final_text.append(f"[Invalid plan: {e}]")
+                    prompt = f"That plan is invalid: {e}\nReturn a corrected plan in the same JSON format."
+                    if not selection.full:
+                        # The plan may have needed a tool that wasn't offered, so offer all of them
+                        selection.widen()
+                        prompt += f"\n\nAll available tools:\n{describe_tools(all_available_functions)}"
+                    continue
+
+                if not plan["steps"]:
+                    if plan["answer"]:
+                        final_text.append(plan["answer"])
+                        return "\n".join(final_text)
+                    break
+
+                if await executor.run(plan["steps"], on_step=_on_step):
+                    break
+                prompt = REPLAN_PROMPT.format(
+                    query=query,
+                    completed=self._format_step_results(executor.results, ("ok",)),
+                    failed=self._format_step_results(executor.results, ("error", "skipped")),
+                )
+
+            answer_response = await self._send_message(
+                chat,
+                ANSWER_PROMPT.format(query=query, results=self._format_step_results(
+                    executor.results, ("ok", "error", "skipped"))),
+                generation_config={"temperature": 0.0}
+            )
+            final_text.append(self._response_text(answer_response) or "[No final answer generated]")
+
+        except Exception as e:
+            print(f"Gemini API error: {str(e)}")
+            traceback.print_exc()
+            return f"Error calling Gemini API: {str(e)}"
+
+        return "\n".join(final_text)
 
     def _extract_tools_from_plan(self, plan_text, available_functions):
-        """Extract tool names mentioned in a plan text"""
+        """Names of the given tools that a plan text mentions as whole identifiers"""
         tool_names = []
-        
-        # Create a mapping of lowercase tool names to actual tool names
-        # This helps with case insensitive matching
-        name_map = {}
         for func in available_functions:
             name = func.get('name', '')
-            if name:
-                name_map[name.lower()] = name
-                
-                # Also add versions without special characters for fuzzy matching
-                simple_name = ''.join(c for c in name.lower() if c.isalnum() or c == '_')
-                if simple_name and simple_name != name.lower():
-                    name_map[simple_name] = name
-        
-        # Look for tool names in the plan text
-        plan_lower = plan_text.lower()
-        for simple_name, actual_name in name_map.items():
-            if simple_name in plan_lower:
-                if actual_name not in tool_names:
-                    tool_names.append(actual_name)
-                
+            # Word boundaries, so "read_file" in a plan doesn't pick up "read" or "read_files"
+            if name and name not in tool_names and re.search(rf'\b{re.escape(name)}\b', plan_text, re.IGNORECASE):
+                tool_names.append(name)
         return tool_names
 
+    async def render_events(self, events: AsyncIterator[Dict[str, Any]], label: str = "") -> None:
+        """Print query events to the terminal as they arrive.
+
+        With a label (used when several queries run at once) text is printed a
+        whole line at a time, prefixed with the label, so queries don't interleave mid-line.
+        """
+        prefix = f"[{label}] " if label else ""
+        streamed_text = False
+        pending_line = ""
+        async for event in events:
+            if event["type"] == "text":
+                streamed_text = True
+                if not label:
+                    print(event["text"], end="", flush=True)
+                    continue
+                *lines, pending_line = (pending_line + event["text"]).split("\n")
+                for line in lines:
+                    print(f"{prefix}{line}", flush=True)
+            elif event["type"] == "tool_started":
+                print(f"\n{prefix}-> {event['tool']}({event['args']})", flush=True)
+            elif event["type"] == "tool_finished":
+                status = f"failed: {event['error']}" if event["error"] else \
+                    ("done (cached)" if event.get("cached") else "done")
+                print(f"{prefix}<- {event['tool']} {status} in {event['seconds']:.2f}s", flush=True)
+            elif event["type"] == "final":
+                # The answer was already shown as it streamed in
+                if not streamed_text:
+                    print("\n" + "\n".join(f"{prefix}{line}" for line in event["text"].split("\n")))
+                elif pending_line:
+                    print(f"{prefix}{pending_line}")
+                else:
+                    print()
+
+    async def _ainput(self, prompt: str) -> Optional[str]:
+        """Read a line from stdin without blocking the event loop; returns None at EOF"""
+        print(prompt, end="", flush=True)
+        if self._input_queue is None:
+            self._input_queue = asyncio.Queue()
+            # readline blocks, so it runs on a daemon thread, which unlike an executor
+            # worker does not keep the process alive on exit while waiting for Enter
+            threading.Thread(target=self._read_stdin, args=(asyncio.get_running_loop(), self._input_queue),
+                             name="stdin", daemon=True).start()
+        line = await self._input_queue.get()
+        if not line:
+            return None
+        return line.rstrip("\n")
+
+    @staticmethod
+    def _read_stdin(loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> None:
+        """Hand stdin lines to the event loop until EOF, which is passed on as an empty string"""
+        while True:
+            line = sys.stdin.readline()
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, line)
+            except RuntimeError:
+                # The loop has closed
+                return
+            if not line:
+                return
+
+    async def _run_chat_query(self, query_id: int, query: str) -> None:
+        """Run one chat loop query within the maxConcurrentQueries limit"""
+        if self._query_semaphore.locked():
+            print(f"[{query_id}] queued, {len(self._query_tasks)} queries in flight")
+        async with self._query_semaphore:
+            try:
+                await self.render_events(self.process_query_events(query), label=str(query_id))
+            except Exception as e:
+                print(f"\n[{query_id}] Error: {str(e)}")
+
+    def print_server_logs(self, server_name: str = "", count: str = "20") -> None:
+        """Print the last lines a server wrote to stdout/stderr (chat command: /logs <server> [lines])"""
+        client = self.mcp_clients.get(server_name)
+        if client is None:
+            print(f"Usage: /logs <server> [lines], servers: {', '.join(self.mcp_clients)}")
+            return
+        lines = client.output.tail(int(count) if count.isdigit() else 20)
+        print(f"\n--- {server_name}: last {len(lines)} of {client.output.total_lines} lines ---")
+        print("\n".join(lines) if lines else "(no output)")
+
+    def print_pool_stats(self) -> None:
+        """Print each server's session pool: size, sessions busy and calls made (chat command: /pools)"""
+        for server_name, client in self.mcp_clients.items():
+            pool = client.pool.summary()
+            calls = ", ".join(str(session["calls"]) for session in pool["sessions"])
+            print(f"{server_name}: {pool['size']} sessions ({pool['min']}-{pool['max']}), {pool['busy']} busy, "
+                  f"{pool['in_flight']} calls in flight, {pool['busy_calls']} of {pool['calls']} calls found "
+                  f"every session busy, calls per session: {calls or '-'}")
+
     async def chat_loop(self):
-        """Run an interactive chat loop"""
+        """Run an interactive chat loop.
+
+        Each query runs as its own task with its own chat session, so the next
+        query can be typed while earlier ones are still running.
+        """
         print("\nHost application Started!")
-        print("Type your queries or 'quit' to exit.")
+        print("Type your queries, '/logs <server>' to see a server's output, '/pools' for session pool usage, "
+              "or 'quit' to exit.")
+        self._query_semaphore = asyncio.Semaphore(int(self.host_settings.get('maxConcurrentQueries', 4)))
+        query_id = 0
         
         while True:
             try:
-                query = input("\nQuery: ").strip()
-                if query.lower() == 'quit':
+                query = await self._ainput("\nQuery: ")
+                if query is None or query.strip().lower() == 'quit':
                     break
-                    
-                final_llm_response = await self.process_query(query)
-                print("\n" + final_llm_response)
+                query = query.strip()
+                if not query:
+                    continue
+                if query.startswith('/logs'):
+                    self.print_server_logs(*query.split()[1:])
+                    continue
+                if query == '/pools':
+                    self.print_pool_stats()
+                    continue
+
+                query_id += 1
+                task = asyncio.create_task(self._run_chat_query(query_id, query))
+                self._query_tasks.add(task)
+                task.add_done_callback(self._query_tasks.discard)
                     
             except Exception as e:
                 print(f"\nError: {str(e)}")
 
-    async def run(self):
-        """Main run loop for the server host."""
+        if self._query_tasks:
+            print(f"Waiting for {len(self._query_tasks)} running queries to finish...")
+            await asyncio.gather(*self._query_tasks, return_exceptions=True)
+
+    async def _start_one_server(self, server_name: str, config: Dict[str, Any]) -> bool:
+        """Start a single server within its startup deadline and register it on success."""
+        timeout = float(config.get('startupTimeout', self.host_settings.get('startupTimeout', 60)))
+        client = MCPClient(server_name, config)
+        client.lazy = bool(config.get('lazy', self.host_settings.get('lazyStartup', False)))
+        client.idle_timeout = float(config.get('idleTimeout', self.host_settings.get('idleTimeout', 0)))
+        client.port_allocation = config.get('portAllocation', self.host_settings.get('portAllocation', 'fixed'))
+        client.configure({**self.host_settings, **config, 'circuitBreaker': {
+            **self.host_settings.get('circuitBreaker', {}), **config.get('circuitBreaker', {})}})
+        start_time = time.perf_counter()
+        report = {"status": "starting", "seconds": None, "ready": None, "tools": 0, "error": ""}
+        self.startup_report[server_name] = report
+        try:
+            manifest = self.manifests.load(server_name, config) if client.lazy else None
+            if manifest:
+                # Advertise the stored tools now and start the process on first use
+                client.tools = manifest["tools"]
+                client.tools_version = 1
+                self.mcp_clients[server_name] = client
+                report["status"] = "lazy"
+                report["tools"] = len(client.tools)
+                print(f"Advertising {len(client.tools)} tools of '{server_name}' from its manifest")
+                return True
+            await asyncio.wait_for(client.start_server(), timeout=timeout)
+            if not client.session:
+                raise Exception(client.startup_error or "no session established")
+            self.mcp_clients[server_name] = client
+            report["status"] = "ready"
+            report["ready"] = client.startup_metrics["ready"]
+            report["tools"] = len(client.tools)
+            print(f"Successfully started {server_name}, : {client}")
+            return True
+        except asyncio.CancelledError:
+            # Shutting down while this server was still starting
+            await client.stop_server()
+            raise
+        except asyncio.TimeoutError:
+            report["status"] = "timeout"
+            report["error"] = f"not ready after {timeout:.0f}s"
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = str(e)
+        finally:
+            report["seconds"] = time.perf_counter() - start_time
+
+        print(f"Failed to start server '{server_name}': {report['error']}")
+        await client.stop_server()
+        return False
+
+    async def start_all_servers(self, servers: Dict[str, Any]) -> None:
+        """Start all servers concurrently and return once the required ones have settled.
+
+        Servers marked ``"required": false`` in config.json keep starting in the
+        background and are picked up by the host as soon as they are ready.
+        """
+        start_time = time.perf_counter()
+        required_tasks = []
+        for server_name, config in servers.items():
+            task = asyncio.create_task(self._start_one_server(server_name, config))
+            if config.get('required', True):
+                required_tasks.append(task)
+            else:
+                self._background_tasks.add(task)
+                task.add_done_callback(self._on_background_server_started(server_name))
+
+        await asyncio.gather(*required_tasks)
+        self.print_startup_table(time.perf_counter() - start_time)
+
+    def _on_background_server_started(self, server_name: str):
+        """Build a done-callback that loads the tools of a server started in the background."""
+        def _done(task: asyncio.Task):
+            self._background_tasks.discard(task)
+            if task.cancelled() or not task.result():
+                return
+            report = self.startup_report[server_name]
+            print(f"\n[{server_name} ready after {report['seconds']:.2f}s with {report['tools']} tools]")
+            # Servers that finish before load_all_tools are picked up there instead
+            if self._tools_loaded:
+                self.register_server_tools(server_name)
+        return _done
+
+    def print_startup_table(self, total_seconds: float) -> None:
+        """Print how long each server took to start."""
+        name_width = max([len("server")] + [len(name) for name in self.startup_report])
+        print(f"\n{'server'.ljust(name_width)}  {'status':<8}  {'seconds':>8}  {'ready':>8}  {'tools':>5}  error")
+        for server_name, report in self.startup_report.items():
+            seconds = f"{report['seconds']:.2f}" if report['seconds'] is not None else "-"
+            ready = f"{report['ready']:.2f}" if report['ready'] is not None else "-"
+            print(f"{server_name.ljust(name_width)}  {report['status']:<8}  {seconds:>8}  {ready:>8}  "
+                  f"{report['tools']:>5}  {report['error']}")
+        print(f"Startup finished in {total_seconds:.2f}s\n")
+
+    async def serve_api(self, bind_host: str, port: int) -> None:
+        """Serve queries over HTTP/SSE instead of the interactive chat loop"""
+        api = APIServer(self, self.host_settings.get('api', {}))
+        config = uvicorn.Config(api.create_app(), host=bind_host, port=port, log_level="warning")
+        print(f"Serving MCP host API on http://{bind_host}:{port}")
+        await uvicorn.Server(config).serve()
+
+    async def shutdown(self) -> None:
+        """Stop the supervisor and all servers, the servers in parallel"""
+        await self.supervisor.stop()
+        if self._idle_task:
+            self._idle_task.cancel()
+            await asyncio.gather(self._idle_task, return_exceptions=True)
+            self._idle_task = None
+        background = list(self._background_tasks)
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+
+        clients = list(self.mcp_clients.items())
+        if clients:
+            print(f"\nShutting down {len(clients)} servers...")
+        await asyncio.gather(*(client.stop_server() for _, client in clients), return_exceptions=True)
+        for server_name, _ in clients:
+            self.unregister_server_tools(server_name, reassign=False)
+            self.mcp_clients.pop(server_name, None)
+        if clients:
+            print("All servers stopped")
+
+    async def run(self, serve: Optional[Tuple[str, int]] = None):
+        """Main run loop for the server host.
+
+        With serve set to (host, port) queries are accepted over HTTP instead
+        of from the terminal.
+        """
         servers = self.load_server_config()
         #print(f"Servers: {servers}")
         try:
-            #Start all servers
-            for server_name, config in servers.items():
-                
-                try:
-                    client = MCPClient(server_name, config)
-                    self.mcp_clients[server_name] = client
-                    await client.start_server()
-                    print(f"Successfully started {server_name}, : {client}")
-                except Exception as e:
-                    print(f"Failed to start server '{server_name}': {e}")
-                    continue
-            print("All servers started")
-            print("Starting chat loop")
+            if self.recorder.replaying:
+                # The recording stands in for the servers, nothing is started
+                self.mcp_clients.update(self.recorder.replay_clients(servers))
+                print(f"Replaying servers: {', '.join(self.mcp_clients)}")
+            else:
+                #Start all servers
+                await self.start_all_servers(servers)
+                print("All required servers started")
+                # Restart servers that crash and reconnect dropped sessions from here on
+                self.supervisor.start()
             await self.load_all_tools()
-            await self.chat_loop()        
-            
-            # Keep running until interrupted
-            #TODO: Keep checking if servers are running
-            #while self.running_servers:
-            #    for server_name, process in list(self.running_servers.items()):
-            #        if process.poll() is not None:
-            #            stdout, stderr = process.communicate()
-            #            print(f"\nServer '{server_name}' has stopped:")
-            #            print(f"stdout: {stdout}")
-            #            print(f"stderr: {stderr}")
-            #            await self.stop_server(server_name)
-                
-            #    await asyncio.sleep(1)
-        
-
+            if any(client.lazy and client.idle_timeout > 0 for client in self.mcp_clients.values()):
+                self._idle_task = asyncio.create_task(self._stop_idle_servers())
+            if serve:
+                await self.serve_api(*serve)
+            else:
+                print("Starting chat loop")
+                await self.chat_loop()
         except KeyboardInterrupt:
-            print("\nShutting down servers...")
-            
-            for server_name in list(self.mcp_clients.keys()):
-                client = self.mcp_clients[server_name]
-                await client.stop_server()
-                await client.close()  # Using close() instead of disconnect()
-                del self.mcp_clients[server_name]
-                print(f"Stopped server: {server_name}")
-                print(f"mcp_clients: {self.mcp_clients}")
-            print("All servers stopped")
+            print("\nInterrupted")
+        finally:
+            await self.shutdown()
+            self.recorder.close()
 
 
 async def main():
-    host = MCPHost()
-    await host.run()
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the MCP host')
+    parser.add_argument('--config', default='config.json', help='Server configuration file')
+    parser.add_argument('--serve', action='store_true', help='Serve an HTTP/SSE API instead of the chat loop')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind the API to')
+    parser.add_argument('--port', type=int, default=8080, help='Port for the API')
+    parser.add_argument('--record', metavar='PATH', help='Record LLM and tool traffic to this file')
+    parser.add_argument('--replay', metavar='PATH', help='Serve LLM and tool traffic from a recording')
+    parser.add_argument('--replay-latency', choices=['original', 'zero'], default='original',
+                        help='Wait as long as the recorded calls took, or not at all')
+    args = parser.parse_args()
+
+    recording = None
+    if args.record:
+        recording = {"mode": "record", "path": args.record}
+    elif args.replay:
+        recording = {"mode": "replay", "path": args.replay, "latency": args.replay_latency}
+    host = MCPHost(args.config, recording=recording)
+    await host.run(serve=(args.host, args.port) if args.serve else None)
 
 if __name__ == "__main__":
     asyncio.run(main())
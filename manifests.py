@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+from typing import Dict, Any, List, Optional
+
+import mcp.types as types
+
+# Entries of a server's config.json section that decide what server runs
+MANIFEST_KEY_FIELDS = ("command", "args", "env", "port", "transport", "module", "object", "url")
+
+
+class ManifestCache:
+    """On-disk cache of each server's tool list, so a server can be advertised before it is started.
+
+    A manifest is stored per server under a key made of its config entry
+    (command, args, env, port, transport, module, object, url) and the size and
+    modification time of any file named in its args or module, so editing the
+    server script or its command line starts a new manifest. The manifest also
+    records the server name and version the server reported; when the real
+    server starts and reports a different version or tool list, the manifest
+    is rewritten.
+
+    The directory is set with the top-level "manifestCache" setting (default .mcp_manifests).
+    """
+
+    def __init__(self, directory: str = ".mcp_manifests"):
+        self.directory = directory
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the manifest cache settings from config.json"""
+        self.directory = settings.get('manifestCache', self.directory)
+
+    @staticmethod
+    def config_key(server_config: Dict[str, Any]) -> str:
+        """Hash of the parts of a server's config entry (and the files it runs) that decide its tools"""
+        entry = {field: server_config.get(field) for field in MANIFEST_KEY_FIELDS}
+        files = {}
+        for arg in [*server_config.get('args', []), server_config.get('module')]:
+            if isinstance(arg, str) and os.path.isfile(arg):
+                stat = os.stat(arg)
+                files[arg] = [stat.st_size, int(stat.st_mtime)]
+        text = json.dumps({"entry": entry, "files": files}, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    def path_for(self, server_name: str, server_config: Dict[str, Any]) -> str:
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in server_name)
+        return os.path.join(self.directory, f"{safe_name}-{self.config_key(server_config)}.json")
+
+    def load(self, server_name: str, server_config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Stored manifest {"server": ..., "tools": [Tool]} of a server, or None if there is none for its config"""
+        path = self.path_for(server_name, server_config)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+            manifest["tools"] = [types.Tool.model_validate(tool) for tool in manifest["tools"]]
+            return manifest
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"Ignoring unreadable tool manifest {path}: {e}")
+            return None
+
+    def save(self, server_name: str, server_config: Dict[str, Any], tools: List[Any],
+             server_info: Optional[Any] = None) -> bool:
+        """Store a server's tool list and version; returns False if the stored one was already the same"""
+        manifest = {
+            "server": server_info.model_dump(mode="json", exclude_none=True) if server_info else {},
+            "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools],
+        }
+        path = self.path_for(server_name, server_config)
+        text = json.dumps(manifest, indent=2, sort_keys=True)
+        try:
+            with open(path) as f:
+                if f.read() == text:
+                    return False
+        except FileNotFoundError:
+            pass
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not save tool manifest for '{server_name}': {e}")
+            return False
+        print(f"Saved tool manifest for '{server_name}' ({len(tools)} tools)")
+        return True
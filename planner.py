@@ -0,0 +1,250 @@
+import asyncio
+import json
+import re
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Set
+
+# Matches ${step_id} or ${step_id.field.0.name} inside argument strings
+REFERENCE_PATTERN = re.compile(r'\$\{([A-Za-z0-9_\-]+)((?:\.[A-Za-z0-9_\-]+)*)\}')
+
+PLAN_PROMPT = """Given the following task: '{query}', plan every tool call needed to accomplish it.
+
+Available tools:
+{tool_list}
+
+Respond with JSON only, in this format:
+{{"steps": [{{"id": "s1", "tool": "<tool name>", "args": {{"<param>": "<value>"}}, "depends_on": []}}]}}
+
+Rules:
+- Give every step a unique id.
+- To use the output of an earlier step in an argument, write ${{<step id>}} for its whole text output or ${{<step id>.<field>}} for a field of its JSON output (list indexes are written as fields, e.g. ${{s1.events.0.id}}).
+- A step runs as soon as the steps it references or lists in depends_on have finished, so only add dependencies that are really needed.
+- If no tools are needed, return {{"steps": [], "answer": "<your answer>"}}."""
+
+REPLAN_PROMPT = """Some steps of the plan for '{query}' did not succeed.
+
+Finished steps and their outputs:
+{completed}
+
+Failed or skipped steps:
+{failed}
+
+Return a new plan in the same JSON format for the remaining work only. New steps may reference the finished steps above by id. Use new ids for new steps.
+If the task cannot be completed, return {{"steps": [], "answer": "<explanation>"}}."""
+
+ANSWER_PROMPT = """The plan for '{query}' has finished. Step results:
+{results}
+
+Using these results, give the final answer to the task."""
+
+
+def describe_tools(function_declarations: List[Dict[str, Any]]) -> str:
+    """Render function declarations as a compact tool list for the planning prompt"""
+    lines = []
+    for function in function_declarations:
+        properties = function.get("parameters", {}).get("properties", {})
+        required = set(function.get("parameters", {}).get("required", []))
+        params = ", ".join(
+            f"{name}{'' if name in required else '?'}: {prop.get('type', 'any')}"
+            for name, prop in properties.items()
+        )
+        lines.append(f"- {function['name']}({params}): {function.get('description') or ''}".strip())
+    return "\n".join(lines)
+
+
+def parse_plan(text: str, known_tools: Set[str], existing_ids: Set[str] = frozenset()) -> Dict[str, Any]:
+    """Parse and validate a plan returned by the LLM.
+
+    Returns {"steps": [...], "answer": str or None}. Raises ValueError when the
+    plan is not valid JSON, uses unknown tools or step ids, or has a cycle.
+    """
+    text = text.strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1).strip()
+    try:
+        plan = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Plan is not valid JSON: {e}")
+
+    if isinstance(plan, list):
+        plan = {"steps": plan}
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps", []), list):
+        raise ValueError("Plan must be an object with a 'steps' list")
+
+    steps = []
+    step_ids = set()
+    for index, raw_step in enumerate(plan.get("steps", [])):
+        if not isinstance(raw_step, dict) or not raw_step.get("tool"):
+            raise ValueError(f"Step {index} has no tool")
+        step_id = str(raw_step.get("id") or f"step{index + 1}")
+        if step_id in step_ids or step_id in existing_ids:
+            raise ValueError(f"Duplicate step id '{step_id}'")
+        if raw_step["tool"] not in known_tools:
+            raise ValueError(f"Step '{step_id}' uses unknown tool '{raw_step['tool']}'")
+        args = raw_step.get("args") or {}
+        if not isinstance(args, dict):
+            raise ValueError(f"Step '{step_id}' args must be an object")
+        step_ids.add(step_id)
+        steps.append({
+            "id": step_id,
+            "tool": raw_step["tool"],
+            "args": args,
+            "depends_on": set(str(dep) for dep in raw_step.get("depends_on") or []) | find_references(args),
+        })
+
+    for step in steps:
+        unknown = step["depends_on"] - step_ids - set(existing_ids)
+        if unknown:
+            raise ValueError(f"Step '{step['id']}' depends on unknown steps {sorted(unknown)}")
+    _check_acyclic(steps)
+
+    return {"steps": steps, "answer": plan.get("answer")}
+
+
+def find_references(value: Any) -> Set[str]:
+    """Step ids referenced with ${...} anywhere inside an argument value"""
+    if isinstance(value, str):
+        return {match.group(1) for match in REFERENCE_PATTERN.finditer(value)}
+    if isinstance(value, dict):
+        return set().union(*(find_references(v) for v in value.values())) if value else set()
+    if isinstance(value, list):
+        return set().union(*(find_references(v) for v in value)) if value else set()
+    return set()
+
+
+def _check_acyclic(steps: List[Dict[str, Any]]) -> None:
+    """Raise ValueError if the step dependencies contain a cycle"""
+    pending = {step["id"]: set(step["depends_on"]) for step in steps}
+    # Dependencies on steps from earlier plans are already satisfied
+    for deps in pending.values():
+        deps.intersection_update(pending)
+    while pending:
+        ready = [step_id for step_id, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Plan has a dependency cycle between {sorted(pending)}")
+        for step_id in ready:
+            del pending[step_id]
+        for deps in pending.values():
+            deps.difference_update(ready)
+
+
+def result_to_text(result: Any) -> str:
+    """Text output of a tool result, joining its text content parts"""
+    content = getattr(result, "content", None)
+    if content is None:
+        return str(result)
+    texts = [getattr(item, "text", None) for item in content]
+    return "\n".join(text if text is not None else str(item) for text, item in zip(texts, content))
+
+
+def _lookup(output: str, path: List[str]) -> Any:
+    """Follow a dotted field path into a step's JSON output"""
+    value = json.loads(output)
+    for field in path:
+        if isinstance(value, list):
+            value = value[int(field)]
+        else:
+            value = value[field]
+    return value
+
+
+def resolve_args(value: Any, outputs: Dict[str, str]) -> Any:
+    """Substitute ${step} / ${step.field} references with earlier step outputs.
+
+    A string that is exactly one reference is replaced by the referenced value
+    itself (so numbers and objects keep their type); references embedded in a
+    longer string are substituted as text.
+    """
+    if isinstance(value, dict):
+        return {key: resolve_args(v, outputs) for key, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_args(v, outputs) for v in value]
+    if not isinstance(value, str):
+        return value
+
+    def _resolve(match):
+        step_id, path = match.group(1), match.group(2)
+        if not path:
+            return outputs[step_id]
+        try:
+            return _lookup(outputs[step_id], path.strip(".").split("."))
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"Cannot resolve ${{{step_id}{path}}}: {e}")
+
+    def _resolve_text(match):
+        resolved = _resolve(match)
+        return resolved if isinstance(resolved, str) else json.dumps(resolved)
+
+    whole = REFERENCE_PATTERN.fullmatch(value)
+    if whole:
+        return _resolve(whole)
+    return REFERENCE_PATTERN.sub(_resolve_text, value)
+
+
+class DAGExecutor:
+    """Runs plan steps as soon as their dependencies finish, up to max_parallel at a time"""
+
+    def __init__(self, call_tool: Callable[[str, Dict[str, Any]], Awaitable[Any]], max_parallel: int = 8):
+        self.call_tool = call_tool
+        self.max_parallel = max_parallel
+        # Step id -> {"tool", "args", "status": ok/error/skipped, "output", "error", "result"}
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def outputs(self) -> Dict[str, str]:
+        """Text outputs of every step that succeeded"""
+        return {step_id: r["output"] for step_id, r in self.results.items() if r["status"] == "ok"}
+
+    async def run(self, steps: List[Dict[str, Any]],
+                  on_step: Optional[Callable[[str, Dict[str, Any]], None]] = None) -> bool:
+        """Execute the steps; returns True if every step succeeded"""
+        semaphore = asyncio.Semaphore(self.max_parallel)
+        waiting = {step["id"]: step for step in steps}
+        running: Dict[asyncio.Task, str] = {}
+
+        async def _run_step(step):
+            async with semaphore:
+                args = resolve_args(step["args"], self.outputs())
+                return args, await self.call_tool(step["tool"], args)
+
+        while waiting or running:
+            progressed = False
+            for step_id, step in list(waiting.items()):
+                dep_status = [self.results.get(dep, {}).get("status") for dep in step["depends_on"]]
+                if any(status in ("error", "skipped") for status in dep_status):
+                    progressed = True
+                    del waiting[step_id]
+                    self.results[step_id] = {"tool": step["tool"], "args": step["args"], "status": "skipped",
+                                             "output": "", "error": "a dependency failed", "result": None}
+                    if on_step:
+                        on_step(step_id, self.results[step_id])
+                elif all(status == "ok" for status in dep_status):
+                    progressed = True
+                    del waiting[step_id]
+                    running[asyncio.create_task(_run_step(step))] = step_id
+
+            if not running:
+                if waiting and not progressed:
+                    # Dependencies that can never finish; report instead of spinning
+                    for step_id, step in waiting.items():
+                        self.results[step_id] = {"tool": step["tool"], "args": step["args"], "status": "skipped",
+                                                 "output": "", "error": "unresolvable dependency", "result": None}
+                    waiting.clear()
+                continue
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step_id = running.pop(task)
+                step = next(s for s in steps if s["id"] == step_id)
+                try:
+                    args, result = task.result()
+                    if getattr(result, "isError", False):
+                        raise Exception(result_to_text(result))
+                    self.results[step_id] = {"tool": step["tool"], "args": args, "status": "ok",
+                                             "output": result_to_text(result), "error": "", "result": result}
+                except Exception as e:
+                    self.results[step_id] = {"tool": step["tool"], "args": step["args"], "status": "error",
+                                             "output": "", "error": str(e), "result": None}
+                if on_step:
+                    on_step(step_id, self.results[step_id])
+
+        return all(self.results[step["id"]]["status"] == "ok" for step in steps)
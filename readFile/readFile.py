@@ -1,5 +1,4 @@
-from typing import Any, Dict, List 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 from starlette.applications import Starlette
 from sse_starlette.sse import EventSourceResponse
 from mcp.server.sse import SseServerTransport
@@ -11,9 +10,12 @@ import os
 # Initialize FastMCP server
 mcp = FastMCP("Read content of a file")
 
+# Characters per progress message when the host reads the file as a stream
+CHUNK_SIZE = 64 * 1024
+
 
 @mcp.tool("read_from_csv_file")
-async def get_csv_file_content(file_path: str) -> List[Dict[str, str]]:
+async def get_csv_file_content(file_path: str, ctx: Context) -> str:
     """
     Returns contents of a csv file.
     """
@@ -21,9 +23,16 @@ async def get_csv_file_content(file_path: str) -> List[Dict[str, str]]:
     currentDir = os.path.basename(os.getcwd())
     file_path = os.path.join(parentDir, currentDir, file_path)
     print("Readig from" , file_path)
+    meta = ctx.request_context.meta
     with open(file_path, 'r') as file:
-        print(f"File content: {file.read()}")
-        return file.read()
+        if meta is None or meta.progressToken is None:
+            return file.read()
+        # The host streams this tool's result: send the file in chunks so it is never read whole
+        sent = 0
+        while chunk := file.read(CHUNK_SIZE):
+            sent += len(chunk)
+            await ctx.report_progress(sent, None, chunk)
+        return ""
 
 
 def create_starlette_app(mcp_server: Server, *, debug: bool = False) -> Starlette:
@@ -57,9 +66,16 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run MCP SSE-based server')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8081, help='Port to listen on')
+    parser.add_argument('--fd', type=int, default=None, help='Listening socket inherited from the host, instead of --host/--port')
+    parser.add_argument('--transport', choices=['sse', 'stdio'], default='sse', help='Serve over SSE, or over stdin/stdout for a host using the stdio transport')
     args = parser.parse_args()
 
     # Bind SSE request handling to MCP server
     starlette_app = create_starlette_app(mcp_server, debug=True)
 
-    uvicorn.run(starlette_app, host=args.host, port=args.port)
+    if args.transport == 'stdio':
+        mcp.run(transport='stdio')
+    elif args.fd is not None:
+        uvicorn.run(starlette_app, fd=args.fd)
+    else:
+        uvicorn.run(starlette_app, host=args.host, port=args.port)
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+import google.generativeai as genai
+import mcp.types as types
+
+from client import MCPClient
+from tool_cache import canonical_args
+
+protos = genai.protos
+
+RECORDING_VERSION = 1
+
+
+def _content_to_dict(content) -> Dict[str, Any]:
+    return type(content).to_dict(content)
+
+
+def _first_content(response):
+    """Content of the first candidate of a (chunk of a) Gemini response, or None"""
+    candidates = getattr(response, "candidates", None)
+    return candidates[0].content if candidates else None
+
+
+def llm_request_key(content, generation_config: Optional[Dict[str, Any]]) -> str:
+    """Key matching a replayed LLM request to the recorded one: the prompt and response mime type"""
+    mime_type = (generation_config or {}).get("response_mime_type", "")
+    return hashlib.sha1(f"{mime_type}\n{content}".encode()).hexdigest()[:16]
+
+
+class ReplayResponse:
+    """Recorded Gemini response, iterable like a streamed response"""
+
+    def __init__(self, content: Dict[str, Any], chunks: List[List[Any]] = (),
+                 recorder: Optional["TrafficRecorder"] = None, seconds: float = 0.0):
+        self.candidates = [protos.Candidate(content=protos.Content(content))]
+        self._chunks = list(chunks)
+        self._recorder = recorder
+        self._seconds = seconds
+
+    @property
+    def text(self) -> str:
+        return "".join(part.text for part in self.candidates[0].content.parts if part.text)
+
+    async def __aiter__(self):
+        if not self._chunks:
+            yield self
+            return
+        # The first chunk was already waited for by send_message_async
+        previous = self._chunks[0][0]
+        for chunk in self._chunks:
+            await self._recorder.wait(chunk[0] - previous)
+            previous = chunk[0]
+            yield ReplayResponse(chunk[1]) if len(chunk) > 1 else self
+        await self._recorder.wait(self._seconds - previous)
+
+
+class ReplayChat:
+    """Chat session answering every message with the recorded response to it"""
+
+    def __init__(self, recorder: "TrafficRecorder", history: Optional[List[Any]] = None):
+        self.recorder = recorder
+        self.history = list(history or [])
+
+    async def send_message_async(self, content, stream: bool = False, generation_config=None, **kwargs):
+        entry = self.recorder.take_llm(content, generation_config)
+        chunks = entry.get("chunks") if stream else None
+        await self.recorder.wait(chunks[0][0] if chunks else entry["seconds"])
+        self.history.append(protos.Content(role="user", parts=[protos.Part(text=str(content))]))
+        response = ReplayResponse(entry["response"], chunks or (), self.recorder, entry["seconds"])
+        self.history.append(response.candidates[0].content)
+        return response
+
+
+class ReplayModel:
+    """Replacement for GenerativeModel that serves a recording"""
+
+    def __init__(self, recorder: "TrafficRecorder"):
+        self.recorder = recorder
+
+    def start_chat(self, history=None) -> ReplayChat:
+        return ReplayChat(self.recorder, history)
+
+
+class ReplaySession:
+    """Stands in for a server's ClientSession, serving its recorded tool results"""
+
+    def __init__(self, recorder: "TrafficRecorder", server_name: str):
+        self.recorder = recorder
+        self.server_name = server_name
+
+    async def list_tools(self) -> types.ListToolsResult:
+        return types.ListToolsResult(tools=self.recorder.manifests.get(self.server_name, []))
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, **kwargs):
+        entry = self.recorder.take_tool(self.server_name, name, arguments or {})
+        await self.recorder.wait(entry["seconds"])
+        if entry.get("error"):
+            raise Exception(entry["error"])
+        return types.CallToolResult.model_validate(entry["result"])
+
+
+class TrafficRecorder:
+    """Records every Gemini request/response and tool call/result, or replays them.
+
+    A recording is a JSON lines file: a header, each server's tool list, then
+    one line per LLM call (prompt key and preview, streamed chunk offsets,
+    response) and per tool call (arguments, result, duration), each with its
+    offset from the start of the recording. Replaying serves those responses
+    in place of Gemini and the MCP servers, so no network or API key is needed.
+
+    Settings come from the "recording" section of config.json (or the
+    --record/--replay options of host.py):
+    - mode: "record" or "replay" (default off)
+    - path: recording file (default traffic.jsonl)
+    - latency: "original" to wait as long as the recorded calls took, "zero" not to wait (default original)
+
+    Replayed requests are matched on the prompt (LLM) or server, tool and
+    arguments (tools); when nothing matches, the next unused recording of the
+    same kind is served and counted in stats["mismatches"].
+    """
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self.path = "traffic.jsonl"
+        self.latency = "original"
+        self.manifests: Dict[str, List[types.Tool]] = {}
+        self.stats = {"llm": 0, "tool": 0, "mismatches": 0}
+        self._file = None
+        self._start_time = 0.0
+        # Replay: entries by exact key and by kind (LLM) or tool name, in recorded order
+        self._exact: Dict[Any, deque] = {}
+        self._fallback: Dict[Any, deque] = {}
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the recording settings from config.json, reading the recording file when replaying"""
+        self.close()
+        self.mode = settings.get('mode')
+        self.path = settings.get('path', self.path)
+        self.latency = settings.get('latency', self.latency)
+        if self.replaying:
+            self.load(self.path)
+        elif self.recording:
+            print(f"Recording LLM and tool traffic to {self.path}")
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        if self._file is None:
+            self._file = open(self.path, 'w')
+            self._start_time = time.perf_counter()
+            self._file.write(json.dumps({"kind": "header", "version": RECORDING_VERSION,
+                                         "started": datetime.now(timezone.utc).isoformat()}) + "\n")
+        entry["t"] = round(time.perf_counter() - self._start_time, 6)
+        self._file.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        self._file.flush()
+
+    def record_tools(self, server_name: str, tools: List[Any]) -> None:
+        """Record a server's tool list, so replay can offer the same tools"""
+        if self.recording:
+            self._write({"kind": "tools", "server": server_name,
+                         "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in tools]})
+
+    def record_llm(self, content, generation_config: Optional[Dict[str, Any]], seconds: float,
+                   chunks: List[Tuple[float, Any]], response) -> None:
+        """Record one Gemini call; chunks are (seconds since the request, chunk) for streamed calls"""
+        if not self.recording:
+            return
+        final = _first_content(response)
+        recorded_chunks = [[round(at, 6), _content_to_dict(chunk)] for at, chunk in chunks if chunk is not None]
+        if len(recorded_chunks) == 1:
+            # A single chunk is the whole response, keep only its timing
+            recorded_chunks[0] = recorded_chunks[0][:1]
+        self._write({
+            "kind": "llm",
+            "key": llm_request_key(content, generation_config),
+            "prompt": str(content)[:200],
+            "prompt_chars": len(str(content)),
+            "seconds": round(seconds, 6),
+            "chunks": recorded_chunks,
+            "response": _content_to_dict(final) if final is not None else {"role": "model", "parts": []},
+        })
+
+    def record_tool(self, server_name: str, tool_name: str, args: Dict[str, Any], result: Any,
+                    seconds: float, error: str = "") -> None:
+        """Record one call_tool request and its result (or error)"""
+        if not self.recording:
+            return
+        self._write({
+            "kind": "tool",
+            "server": server_name,
+            "tool": tool_name,
+            "args": json.loads(canonical_args(args)),
+            "seconds": round(seconds, 6),
+            "error": error,
+            "result": result.model_dump(mode="json", exclude_none=True) if result is not None else None,
+        })
+
+    def load(self, path: str) -> None:
+        """Read a recording for replay"""
+        self._exact.clear()
+        self._fallback.clear()
+        self.manifests.clear()
+        counts = {"llm": 0, "tool": 0}
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                kind = entry.get("kind")
+                if kind == "header" and entry.get("version") != RECORDING_VERSION:
+                    raise ValueError(f"Unsupported recording version {entry.get('version')} in {path}")
+                if kind == "tools":
+                    self.manifests[entry["server"]] = [types.Tool.model_validate(t) for t in entry["tools"]]
+                    continue
+                if kind == "llm":
+                    exact_key, fallback_key = ("llm", entry["key"]), "llm"
+                elif kind == "tool":
+                    exact_key = ("tool", entry["server"], entry["tool"], canonical_args(entry["args"]))
+                    fallback_key = ("tool", entry["server"], entry["tool"])
+                else:
+                    continue
+                entry["used"] = False
+                self._exact.setdefault(exact_key, deque()).append(entry)
+                self._fallback.setdefault(fallback_key, deque()).append(entry)
+                counts[kind] += 1
+        print(f"Replaying {counts['llm']} LLM calls and {counts['tool']} tool calls from {path} "
+              f"({self.latency} latency)")
+
+    def _take(self, exact_key, fallback_key, description: str) -> Dict[str, Any]:
+        """Next unused recorded entry for a request, preferring an exact match"""
+        for entries, exact in ((self._exact.get(exact_key), True), (self._fallback.get(fallback_key), False)):
+            while entries and entries[0]["used"]:
+                entries.popleft()
+            if entries:
+                entry = entries.popleft()
+                entry["used"] = True
+                if not exact:
+                    self.stats["mismatches"] += 1
+                    print(f"[replay] no exact recording for {description}, serving the next recorded one")
+                return entry
+        raise LookupError(f"Recording has no more responses for {description}")
+
+    def take_llm(self, content, generation_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Recorded response for an LLM request"""
+        self.stats["llm"] += 1
+        return self._take(("llm", llm_request_key(content, generation_config)), "llm",
+                          f"LLM prompt {str(content)[:60]!r}")
+
+    def take_tool(self, server_name: str, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Recorded result of a tool call"""
+        self.stats["tool"] += 1
+        return self._take(("tool", server_name, tool_name, canonical_args(args)),
+                          ("tool", server_name, tool_name), f"{server_name}/{tool_name} {canonical_args(args)}")
+
+    async def wait(self, seconds: float) -> None:
+        """Sleep for a recorded duration, unless replaying with zero latency"""
+        if self.latency != "zero" and seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def replay_model(self) -> ReplayModel:
+        return ReplayModel(self)
+
+    def replay_clients(self, servers: Dict[str, Any]) -> Dict[str, MCPClient]:
+        """MCP clients for the recorded servers, answering from the recording instead of a connection"""
+        clients = {}
+        for server_name, tools in self.manifests.items():
+            client = MCPClient(server_name, servers.get(server_name, {}))
+            client.session = ReplaySession(self, server_name)
+            client.tools = list(tools)
+            client.tools_version = 1
+            clients[server_name] = client
+        return clients
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+import mcp.types as types
+
+from planner import result_to_text
+
+# Called by the MCP session for every progress notification of a request: (progress, total, message)
+ProgressCallback = Callable[[float, Optional[float], Optional[str]], Awaitable[None]]
+
+# Put in the queue once the call has finished, after every chunk it sent
+_END = object()
+
+
+def cap_result(result: types.CallToolResult, max_chars: int) -> types.CallToolResult:
+    """The result itself if its text fits in max_chars (0 for no limit), else its text cut off there"""
+    if max_chars <= 0 or not hasattr(result, "content"):
+        return result
+    size = sum(len(getattr(item, "text", "") or "") for item in result.content)
+    if size <= max_chars:
+        return result
+    text = result_to_text(result)[:max_chars]
+    return types.CallToolResult(
+        content=[types.TextContent(type="text", text=f"{text}\n[Result cut off at {max_chars} of {size} characters]")],
+        isError=result.isError)
+
+
+class ResultStream:
+    """A tool result read piece by piece while the server is still producing it.
+
+    A server streams a result by sending each piece as the message of a
+    progress notification for the call, and returns whatever is left
+    (usually nothing) as the tool result, which comes last. Servers that
+    don't stream simply yield their whole result as one piece. Closing the
+    stream before the end cancels the call, so the server stops producing
+    output nobody will read.
+
+        stream = client.stream_tool("read_from_csv_file", {"file_path": "big.csv"})
+        async for chunk in stream:
+            ...
+        await stream.aclose()
+    """
+
+    def __init__(self, start_call: Callable[[ProgressCallback], Awaitable[types.CallToolResult]]):
+        # Makes the call, passing on the progress callback
+        self._start_call = start_call
+        # Filled by the session's receive loop, which must never wait on us
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._finished = False
+        self.result: Optional[types.CallToolResult] = None
+        self.chunks = 0
+        self.chars = 0
+
+    async def _on_progress(self, progress: float, total: Optional[float], message: Optional[str]) -> None:
+        if message:
+            self._queue.put_nowait(message)
+
+    def __aiter__(self) -> "ResultStream":
+        return self
+
+    async def __anext__(self) -> str:
+        if self._finished:
+            raise StopAsyncIteration
+        if self._task is None:
+            self._task = asyncio.create_task(self._start_call(self._on_progress))
+            self._task.add_done_callback(lambda _: self._queue.put_nowait(_END))
+        chunk = await self._queue.get()
+        if chunk is _END:
+            self._finished = True
+            # Raises whatever the call raised
+            self.result = self._task.result()
+            chunk = result_to_text(self.result)
+            if not chunk:
+                raise StopAsyncIteration
+        self.chunks += 1
+        self.chars += len(chunk)
+        return chunk
+
+    async def aclose(self) -> None:
+        """Stop reading, cancelling the call if it is still running"""
+        self._finished = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def collect(self, max_chars: int) -> types.CallToolResult:
+        """Read the stream into one result, stopping after max_chars characters (0 for no limit)"""
+        parts: List[str] = []
+        size = 0
+        cut_off = False
+        try:
+            async for chunk in self:
+                if max_chars > 0 and size + len(chunk) > max_chars:
+                    parts.append(chunk[:max_chars - size])
+                    cut_off = True
+                    break
+                parts.append(chunk)
+                size += len(chunk)
+        finally:
+            await self.aclose()
+        text = "".join(parts)
+        if cut_off:
+            text += f"\n[Result cut off at {max_chars} characters, the rest was not read]"
+        return types.CallToolResult(content=[types.TextContent(type="text", text=text)],
+                                    isError=bool(self.result is not None and self.result.isError))
@@ -0,0 +1,329 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Set
+
+# Schema keywords Gemini can't take; a few are folded into what it can (see SchemaCompiler._expand)
+UNSUPPORTED_FIELDS = frozenset({
+    "anyOf", "allOf", "oneOf", "not", "$ref",
+    "additionalProperties", "patternProperties", "propertyNames",
+    "dependencies", "if", "then", "else", "default",
+    "const", "enum", "format", "contentEncoding", "contentMediaType",
+    "examples", "title", "definitions", "$defs", "$schema", "$id",
+    "uniqueItems", "contains", "multipleOf", "exclusiveMinimum",
+    "exclusiveMaximum", "pattern",
+})
+
+# $refs inlined inside each other before the rest of a branch is cut off, so shared definitions can't blow up the output
+MAX_REF_DEPTH = 16
+
+# Keywords whose lists hold values rather than subschemas
+_VALUE_LISTS = frozenset({"enum", "required", "type", "examples"})
+
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+# Marks a branch cut off by MAX_REF_DEPTH, which depends on how deep it was reached
+_DEPTH_CUT = ""
+
+
+class _Node:
+    """One (sub)schema waiting to be normalized, with the $refs being inlined above it"""
+
+    __slots__ = ("schema", "refs", "parts", "out", "own_refs", "cuts", "cache_ref")
+
+    def __init__(self, schema: Any, refs: tuple):
+        self.schema = schema
+        self.refs = refs
+        # What the output is assembled from, in the schema's key order; None until expanded
+        self.parts: Optional[List[tuple]] = None
+        self.out: Any = None
+        # $refs resolved at this node, and $refs of cycles cut off below it that it doesn't own
+        self.own_refs: tuple = ()
+        self.cuts: Set[str] = set()
+        self.cache_ref: Optional[str] = None
+
+
+def resolve_ref(root: Dict[str, Any], ref: str) -> Any:
+    """The part of root a local $ref ("#/$defs/Item") points to, or None for other refs"""
+    if not ref.startswith("#"):
+        return None
+    target: Any = root
+    for token in ref[1:].split("/")[1:]:
+        token = token.replace("~1", "/").replace("~0", "~")
+        if isinstance(target, dict) and token in target:
+            target = target[token]
+        elif isinstance(target, list) and token.isdigit() and int(token) < len(target):
+            target = target[int(token)]
+        else:
+            return None
+    return target
+
+
+def _pick_option(options: List[Any]) -> Optional[Dict[str, Any]]:
+    """The anyOf/oneOf option to describe: Optional[X] is anyOf [X, null], and X is the one that matters"""
+    options = [option for option in options if isinstance(option, dict)]
+    return next((option for option in options if option.get("type") != "null"), options[0] if options else None)
+
+
+def _clean_flat(schema: Dict[str, Any], combine: bool = True) -> Optional[Dict[str, Any]]:
+    """Normalize a schema in one pass if it has no subschemas or $ref (most leaves), else None.
+
+    With combine, an anyOf/oneOf whose option is itself flat (as for Optional[str]) counts as flat too.
+    """
+    out: Dict[str, Any] = {}
+    for key, value in schema.items():
+        # Checked by type first: this runs for every subschema of every tool, and most values are scalars
+        kind = type(value)
+        if kind not in _SCALAR_TYPES:
+            if combine and (key == "anyOf" or key == "oneOf") and isinstance(value, list):
+                option = _pick_option(value)
+                merged = _clean_flat(option, False) if option is not None else {}
+                if merged is None:
+                    return None
+                for sub_key, sub_value in merged.items():
+                    out.setdefault(sub_key, sub_value)
+                continue
+            if isinstance(value, dict) or (isinstance(value, list) and key not in _VALUE_LISTS):
+                return None
+        if key == "$ref":
+            return None
+        if key not in UNSUPPORTED_FIELDS:
+            out[key] = list(value) if isinstance(value, list) else value
+        elif key == "enum" and isinstance(value, list):
+            if "description" not in out:
+                out["description"] = "Allowed values: " + ", ".join(str(v) for v in value)
+        elif key == "title" and kind is str:
+            out["description"] = f"{value}: {out['description']}" if "description" in out else value
+    return out
+
+
+def schema_key(*parts: Any) -> str:
+    """Content hash of schemas (or of a tool's name and description), equal for equal content.
+
+    Keys are hashed in their order, since the normalized schema keeps it too.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        text = part if isinstance(part, str) else json.dumps(part, separators=(",", ":"), default=str)
+        digest.update(text.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SchemaCompiler:
+    """Turns MCP tool input schemas into Gemini function declarations, each distinct schema once.
+
+    Gemini takes a subset of JSON Schema, so schemas are normalized: local
+    $refs are inlined (a $ref back into a definition being inlined becomes a
+    plain description), anyOf/oneOf collapse to their first non-null option,
+    allOf is merged, enum and title are folded into the description and
+    other unsupported keywords are dropped. The work is done with an explicit
+    stack rather than recursion, so deeply nested schemas can't hit the
+    recursion limit, and a definition referenced from many places is
+    normalized once per schema.
+
+    Results are cached by content hash, so reconnects, restarts and servers
+    sharing schemas reuse them. Returned declarations are shared between
+    callers and must not be modified.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "cycles": 0}
+
+    def _memo(self, key: Optional[str], build) -> Any:
+        if key is None:
+            # Too deeply nested to hash; normalizing still works, it just isn't cached
+            return build()
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]
+        self.stats["misses"] += 1
+        value = build()
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        return value
+
+    @staticmethod
+    def _key(schema: Any) -> Optional[str]:
+        try:
+            return schema_key(schema)
+        except RecursionError:
+            return None
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), **self.stats}
+
+    def normalize(self, schema: Any, key: Optional[str] = None) -> Any:
+        """A Gemini-compatible copy of a JSON schema; key is its schema_key, if already known"""
+        if not isinstance(schema, dict):
+            return schema
+        key = key or self._key(schema)
+        return self._memo(key and "schema:" + key, lambda: self._normalize(schema))
+
+    def declaration(self, name: str, description: Optional[str], input_schema: Any) -> Dict[str, Any]:
+        """The Gemini function declaration of a tool; input_schema may be a dict or JSON text"""
+        key = self._key(input_schema or {})
+        return self._memo(key and f"tool:{schema_key(name, description or '')}:{key}",
+                          lambda: self._build_declaration(name, description, input_schema, key))
+
+    def _build_declaration(self, name: str, description: Optional[str], input_schema: Any,
+                           key: Optional[str]) -> Dict[str, Any]:
+        parameters: Dict[str, Any] = {"type": "object", "properties": {}}
+        if input_schema:
+            try:
+                schema = json.loads(input_schema) if isinstance(input_schema, str) else input_schema
+                cleaned = self.normalize(schema, key)
+                if isinstance(cleaned, dict) and isinstance(cleaned.get("properties"), dict) and cleaned["properties"]:
+                    parameters["properties"] = cleaned["properties"]
+                    valid_required = []
+                    for prop in cleaned.get("required") or []:
+                        if isinstance(prop, str) and prop in parameters["properties"]:
+                            valid_required.append(prop)
+                        else:
+                            print(f"Warning: Required property '{prop}' not found in properties for tool {name}")
+                    if valid_required:
+                        parameters["required"] = valid_required
+            except (json.JSONDecodeError, TypeError, AttributeError) as e:
+                print(f"Error parsing schema for {name}: {e}")
+
+        # Gemini needs at least one parameter, so tools without any take a free-form input
+        if not parameters["properties"]:
+            parameters["properties"] = {"input": {"type": "string", "description": "Input for the tool"}}
+            parameters["required"] = ["input"]
+        return {"name": name, "description": description, "parameters": parameters}
+
+    def _normalize(self, root: Dict[str, Any]) -> Any:
+        """Normalize one schema document, children before their parents"""
+        # Normalized pure {"$ref": ...} nodes whose output doesn't depend on where they appear
+        ref_cache: Dict[str, Any] = {}
+        top = _Node(root, ())
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            if node.parts is None:
+                children = self._expand(node, root, ref_cache)
+                if node.parts is not None:
+                    stack.append(node)
+                    stack.extend(children)
+            else:
+                self._assemble(node)
+                if node.cache_ref is not None and not node.cuts:
+                    ref_cache[node.cache_ref] = node.out
+        return top.out
+
+    def _expand(self, node: _Node, root: Dict[str, Any], ref_cache: Dict[str, Any]) -> List[_Node]:
+        """Inline the node's $refs and plan its output; returns the child nodes to normalize first.
+
+        Leaves node.parts None when the output is already known (a cycle or a cached $ref).
+        """
+        schema = node.schema
+        own: List[str] = []
+        if "$ref" in schema and len(schema) == 1 and isinstance(schema["$ref"], str):
+            if schema["$ref"] in ref_cache:
+                node.out = ref_cache[schema["$ref"]]
+                return []
+            node.cache_ref = schema["$ref"]
+        while "$ref" in schema and isinstance(schema["$ref"], str):
+            ref = schema["$ref"]
+            rest = {key: value for key, value in schema.items() if key != "$ref"}
+            if ref in node.refs or ref in own or len(node.refs) + len(own) >= MAX_REF_DEPTH:
+                # Gemini has no $ref, so a recursive definition ends here with what it says about itself
+                self.stats["cycles"] += 1
+                node.cuts = {ref} if ref in node.refs or ref in own else {_DEPTH_CUT}
+                node.out = {"description": rest.get("description") or f"Nested {ref.rsplit('/', 1)[-1]}, as above"}
+                return []
+            target = resolve_ref(root, ref)
+            if not isinstance(target, dict):
+                # Remote or dangling $ref: keep whatever else the schema says
+                schema = rest
+                break
+            schema = {**target, **rest} if rest else target
+            own.append(ref)
+        node.own_refs = tuple(own)
+        refs = node.refs + node.own_refs
+
+        parts: List[tuple] = []
+        children: List[_Node] = []
+
+        def child(value: Any) -> Any:
+            if not isinstance(value, dict):
+                return value
+            if "properties" not in value and "$ref" not in value:
+                flat = _clean_flat(value)
+                if flat is not None:
+                    return flat
+            sub = _Node(value, refs)
+            children.append(sub)
+            return sub
+
+        for key, value in schema.items():
+            if key in UNSUPPORTED_FIELDS:
+                if key in ("anyOf", "oneOf") and isinstance(value, list):
+                    option = _pick_option(value)
+                    if option is not None:
+                        parts.append(("merge", key, child(option)))
+                elif key == "allOf" and isinstance(value, list):
+                    for sub_schema in value:
+                        if isinstance(sub_schema, dict):
+                            parts.append(("merge", key, child(sub_schema)))
+                elif key == "enum" and isinstance(value, list):
+                    parts.append(("enum", key, value))
+                elif key == "title" and isinstance(value, str):
+                    parts.append(("title", key, value))
+            elif key == "properties" and isinstance(value, dict):
+                # Property names are not keywords, so a property called "title" or "format" is kept
+                parts.append(("map", key, {name: child(sub) for name, sub in value.items()}))
+            elif isinstance(value, dict):
+                parts.append(("value", key, child(value)))
+            elif isinstance(value, list):
+                parts.append(("list", key, [child(item) for item in value]))
+            else:
+                parts.append(("value", key, value))
+        node.parts = parts
+        return children
+
+    @staticmethod
+    def _assemble(node: _Node) -> None:
+        """Build the node's output from its parts once all of its children are normalized"""
+        out: Dict[str, Any] = {}
+        cuts: Set[str] = set()
+
+        def done(value: Any) -> Any:
+            if isinstance(value, _Node):
+                cuts.update(value.cuts)
+                return value.out
+            return value
+
+        for kind, key, value in node.parts:
+            if kind == "value":
+                out[key] = done(value)
+            elif kind == "map":
+                out[key] = {name: done(sub) for name, sub in value.items()}
+            elif kind == "list":
+                out[key] = [done(item) for item in value]
+            elif kind == "merge":
+                merged = done(value)
+                if isinstance(merged, dict):
+                    for sub_key, sub_value in merged.items():
+                        # Don't overwrite existing keys
+                        out.setdefault(sub_key, sub_value)
+            elif kind == "enum":
+                if "description" not in out:
+                    out["description"] = "Allowed values: " + ", ".join(str(v) for v in value)
+            elif kind == "title":
+                out["description"] = f"{value}: {out['description']}" if "description" in out else value
+        node.out = out
+        node.cuts = cuts - set(node.own_refs)
+        node.parts = ()
+
+
+# Shared by every client, so servers exposing the same tools share their declarations
+schema_compiler = SchemaCompiler()
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, List, Optional, Set, Tuple
+
+
+class OutputBuffer:
+    """The most recent lines a server process wrote to stdout and stderr.
+
+    Lines are kept in a ring buffer of max_lines, so a chatty server costs a
+    bounded amount of memory; older lines are dropped. tail() returns the last
+    lines and follow() streams new ones as they arrive.
+    """
+
+    def __init__(self, max_lines: int = 1000):
+        # (time.time(), stream name, line)
+        self.lines: "deque[Tuple[float, str, str]]" = deque(maxlen=max_lines)
+        self.total_lines = 0
+        self._followers: Set[asyncio.Queue] = set()
+
+    def append(self, stream: str, line: str) -> None:
+        entry = (time.time(), stream, line)
+        self.lines.append(entry)
+        self.total_lines += 1
+        for queue in self._followers:
+            if queue.full():
+                # A slow follower misses lines rather than holding up the server
+                queue.get_nowait()
+            queue.put_nowait(entry)
+
+    @staticmethod
+    def format(entry: Tuple[float, str, str]) -> str:
+        timestamp, stream, line = entry
+        return f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {stream}: {line}"
+
+    def tail(self, count: int = 20, stream: Optional[str] = None) -> List[str]:
+        """Last count lines, optionally only those of one stream ("stdout" or "stderr")"""
+        entries = [entry for entry in self.lines if stream is None or entry[1] == stream]
+        return [self.format(entry) for entry in entries[-count:]] if count > 0 else []
+
+    async def follow(self, backlog: int = 0) -> AsyncIterator[str]:
+        """Yield the last backlog lines, then every new line until the caller stops iterating"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self._followers.add(queue)
+        try:
+            for line in self.tail(backlog):
+                yield line
+            while True:
+                yield self.format(await queue.get())
+        finally:
+            self._followers.discard(queue)
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set
+
+from supervisor import is_connection_error
+
+
+class PooledSession:
+    """One session of a pool, held open by its own connection task"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.session = None
+        self.task: Optional[asyncio.Task] = None
+        # Resolved once the session is initialized (or failed to open)
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.closing = asyncio.Event()
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def healthy(self) -> bool:
+        return self.session is not None and self.task is not None and not self.task.done()
+
+    @property
+    def broken(self) -> bool:
+        """Opened (or failed to open) and no longer usable; a session still opening is not broken"""
+        return self.ready.done() and not self.healthy
+
+    async def close(self) -> None:
+        """Close the session and wait for its connection task to finish"""
+        self.closing.set()
+        if self.task and not self.ready.done():
+            # Still in the handshake, which doesn't watch closing
+            self.task.cancel()
+        if self.task:
+            try:
+                await asyncio.wait_for(self.task, timeout=5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            except Exception as e:
+                print(f"Error closing pooled session {self.index}: {e}")
+        self.session = None
+
+
+class SessionPool:
+    """Several sessions to one server, so a slow call doesn't hold up the others.
+
+    The SSE client sends a session's requests one after another, so every
+    call to a server used to queue behind the ones before it. The pool keeps
+    between minSessions and maxSessions sessions and sends each call to the
+    one with the fewest calls in flight. When every session already has
+    maxCallsPerSession calls in flight, another session is opened in the
+    background (up to maxSessions) while the call goes to the least busy one.
+    A session that breaks is dropped and, if the pool fell below minSessions,
+    replaced; extra sessions without calls for sessionIdleTimeout seconds are
+    closed again.
+
+    The first session is the client's own (it lists tools and receives
+    notifications); if it breaks, the whole client is reconnected or restarted
+    by the supervisor.
+
+    Settings come from the server's config.json entry, with defaults from the top level:
+    - minSessions (default 1), maxSessions (default 1)
+    - maxCallsPerSession: calls in flight on every session before another is opened (default 1)
+    - sessionIdleTimeout: seconds an extra session may go unused before it is closed (default 60)
+    """
+
+    def __init__(self, server_name: str,
+                 open_session: Callable[[PooledSession, asyncio.Future], Awaitable[None]]):
+        self.server_name = server_name
+        # Runs a member's connection: opens its session, resolves ready, waits for member.closing
+        self._open_session = open_session
+        self.min_size = 1
+        self.max_size = 1
+        self.max_calls_per_session = 1
+        self.idle_timeout = 60.0
+        # Open sessions and ones still opening; the first is the client's own
+        self.members: List[PooledSession] = []
+        self._opening: Set[asyncio.Task] = set()
+        self._next_index = 0
+        self.stats = {"calls": 0, "opened": 0, "evicted": 0, "closed_idle": 0, "busy_calls": 0,
+                      "peak_in_flight": 0}
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the pool settings from a server's config.json entry"""
+        self.min_size = max(1, int(settings.get('minSessions', self.min_size)))
+        self.max_size = max(self.min_size, int(settings.get('maxSessions', self.max_size)))
+        self.max_calls_per_session = max(1, int(settings.get('maxCallsPerSession', self.max_calls_per_session)))
+        self.idle_timeout = float(settings.get('sessionIdleTimeout', self.idle_timeout))
+
+    @property
+    def in_flight(self) -> int:
+        return sum(member.in_flight for member in self.members)
+
+    def _start(self) -> PooledSession:
+        member = PooledSession(self._next_index)
+        self._next_index += 1
+        member.task = asyncio.create_task(self._open_session(member, member.ready))
+        self.members.append(member)
+        return member
+
+    async def _wait_open(self, member: PooledSession) -> PooledSession:
+        try:
+            await member.ready
+        except BaseException:
+            if member in self.members:
+                self.members.remove(member)
+            await member.close()
+            raise
+        self.stats["opened"] += 1
+        return member
+
+    async def open(self) -> PooledSession:
+        """Open one more session and wait until it is initialized"""
+        return await self._wait_open(self._start())
+
+    def _open_in_background(self) -> None:
+        member = self._start()
+
+        async def _open():
+            try:
+                await asyncio.wait_for(self._wait_open(member), timeout=60)
+            except Exception as e:
+                print(f"Could not open another session to '{self.server_name}': {e}")
+
+        task = asyncio.create_task(_open())
+        self._opening.add(task)
+        task.add_done_callback(self._opening.discard)
+
+    async def fill(self) -> None:
+        """Open sessions until there are minSessions"""
+        while len(self.members) < self.min_size:
+            await self.open()
+
+    def _evict(self, member: PooledSession) -> None:
+        """Drop a broken session, replacing it if the pool fell below minSessions"""
+        if member not in self.members:
+            return
+        self.members.remove(member)
+        self.stats["evicted"] += 1
+        print(f"Dropping broken session {member.index} to '{self.server_name}'")
+        asyncio.create_task(member.close())
+        if self.members and len(self.members) < self.min_size:
+            self._open_in_background()
+
+    def _close_idle(self) -> None:
+        """Close extra sessions that have gone unused for sessionIdleTimeout"""
+        now = time.monotonic()
+        for member in self.members[1:]:
+            if len(self.members) <= self.min_size:
+                break
+            if member.healthy and member.in_flight == 0 and now - member.last_used > self.idle_timeout:
+                self.members.remove(member)
+                self.stats["closed_idle"] += 1
+                asyncio.create_task(member.close())
+
+    def pick(self) -> Optional[PooledSession]:
+        """The healthy session with the fewest calls in flight (the oldest on a tie)"""
+        for member in [m for m in self.members[1:] if m.broken]:
+            self._evict(member)
+        healthy = [member for member in self.members if member.healthy]
+        return min(healthy, key=lambda member: member.in_flight) if healthy else None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """A session to make one call on, counted as busy until the block exits"""
+        member = self.pick()
+        if member is None:
+            raise ConnectionError(f"Server '{self.server_name}' is not connected")
+        if member.in_flight >= self.max_calls_per_session:
+            self.stats["busy_calls"] += 1
+            if len(self.members) < self.max_size:
+                self._open_in_background()
+        member.in_flight += 1
+        member.calls += 1
+        self.stats["calls"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+        try:
+            yield member.session
+        except Exception as e:
+            if is_connection_error(e):
+                member.failures += 1
+                if self.members and member is not self.members[0]:
+                    self._evict(member)
+            raise
+        finally:
+            member.in_flight -= 1
+            member.last_used = time.monotonic()
+            self._close_idle()
+
+    async def close(self) -> None:
+        """Close every session, including ones still opening"""
+        for task in list(self._opening):
+            task.cancel()
+        await asyncio.gather(*self._opening, return_exceptions=True)
+        members, self.members = self.members, []
+        self._next_index = 0
+        await asyncio.gather(*(member.close() for member in members))
+
+    def summary(self) -> Dict[str, Any]:
+        """Size and utilization of the pool: sessions busy, calls in flight and per session"""
+        size = len(self.members)
+        busy = sum(1 for member in self.members if member.in_flight)
+        return {
+            "size": size,
+            "healthy": sum(1 for member in self.members if member.healthy),
+            "busy": busy,
+            "utilization": busy / size if size else 0.0,
+            "in_flight": self.in_flight,
+            "min": self.min_size,
+            "max": self.max_size,
+            "sessions": [{"index": m.index, "in_flight": m.in_flight, "calls": m.calls, "failures": m.failures}
+                         for m in self.members],
+            **self.stats,
+        }
@@ -0,0 +1,192 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional
+
+import anyio
+import httpx
+import mcp.types as types
+from mcp.shared.exceptions import McpError
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Whether a call failed because the connection to its server was lost"""
+    if isinstance(error, McpError):
+        return error.error.code == types.CONNECTION_CLOSED
+    return isinstance(error, (ConnectionError, anyio.ClosedResourceError, anyio.BrokenResourceError,
+                              httpx.TransportError))
+
+
+class ServerSupervisor:
+    """Watches every server's process and session and brings back the ones that fail.
+
+    A server whose session dropped while its process kept running is first
+    reconnected; a server whose process exited (or that can't be reconnected)
+    is restarted, waiting restartInitialDelay seconds before the first attempt
+    and doubling up to restartMaxDelay. After maxRestarts failed or short-lived
+    restarts in a row the server is given up on and its tools are removed; a
+    server that stays up for stableAfter seconds starts over with a fresh budget.
+
+    Settings come from the "supervisor" section of config.json:
+    - enabled (default true), interval: seconds between health checks (default 1)
+    - restartInitialDelay (default 1), restartMaxDelay (default 30), maxRestarts (default 5), stableAfter (default 60)
+    - retries: times an idempotent tool call is retried after a lost connection (default 1)
+    - retryTimeout: seconds such a call waits for its server to come back (default 30)
+    A server entry with "restart": false is reconnected but never restarted.
+
+    Servers attached by "url" are not ours to restart: they are reconnected
+    with the same backoff and never given up on. Since a remote server can
+    also vanish without closing the connection, they are pinged every
+    healthCheckInterval seconds (default 30) and reconnected when a ping gets
+    no answer within healthCheckTimeout seconds (default 5).
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.enabled = True
+        self.interval = 1.0
+        self.restart_initial_delay = 1.0
+        self.restart_max_delay = 30.0
+        self.max_restarts = 5
+        self.stable_after = 60.0
+        self.retries = 1
+        self.retry_timeout = 30.0
+        self.health_check_interval = 30.0
+        self.health_check_timeout = 5.0
+        # Server name -> when an attached server was last pinged
+        self._health_checked: Dict[str, float] = {}
+        # Server name -> consecutive restarts and when the server last came back
+        self.restart_state: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"failures": 0, "reconnects": 0, "restarts": 0, "gave_up": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._recovering: Dict[str, asyncio.Task] = {}
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the supervisor settings from config.json"""
+        self.enabled = bool(settings.get('enabled', True))
+        self.interval = float(settings.get('interval', self.interval))
+        self.restart_initial_delay = float(settings.get('restartInitialDelay', self.restart_initial_delay))
+        self.restart_max_delay = float(settings.get('restartMaxDelay', self.restart_max_delay))
+        self.max_restarts = int(settings.get('maxRestarts', self.max_restarts))
+        self.stable_after = float(settings.get('stableAfter', self.stable_after))
+        self.retries = int(settings.get('retries', self.retries))
+        self.retry_timeout = float(settings.get('retryTimeout', self.retry_timeout))
+        self.health_check_interval = float(settings.get('healthCheckInterval', self.health_check_interval))
+        self.health_check_timeout = float(settings.get('healthCheckTimeout', self.health_check_timeout))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start watching the host's servers"""
+        if self.enabled and not self.running:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        """Stop watching, abandoning any restart in progress"""
+        tasks = [task for task in [self._task, *self._recovering.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._recovering.clear()
+
+    def notify(self) -> None:
+        """Check the servers now instead of at the next interval, e.g. after a call failed"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _watch(self) -> None:
+        while True:
+            for server_name, client in list(self.host.mcp_clients.items()):
+                if server_name in self._recovering:
+                    continue
+                problem = client.connection_problem()
+                if problem:
+                    task = asyncio.create_task(self._recover(server_name, client, problem))
+                elif client.attached and client.session is not None and self._health_check_due(server_name):
+                    task = asyncio.create_task(self._check_health(server_name, client))
+                else:
+                    continue
+                self._recovering[server_name] = task
+                task.add_done_callback(lambda _, name=server_name: self._recovering.pop(name, None))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _health_check_due(self, server_name: str) -> bool:
+        now = time.monotonic()
+        last = self._health_checked.setdefault(server_name, now)
+        if now - last < self.health_check_interval:
+            return False
+        self._health_checked[server_name] = now
+        return True
+
+    async def _check_health(self, server_name: str, client) -> None:
+        """Ping an attached server, reconnecting if it doesn't answer"""
+        try:
+            await asyncio.wait_for(client.session.send_ping(), timeout=self.health_check_timeout)
+        except Exception as e:
+            await self._recover(server_name, client, f"did not answer a health check ({str(e) or type(e).__name__})")
+
+    async def _recover(self, server_name: str, client, problem: str) -> None:
+        """Reconnect or restart a failed server, or give up on it"""
+        self.stats["failures"] += 1
+        print(f"\n[supervisor] Server '{server_name}' {problem}")
+
+        if client.can_reconnect():
+            try:
+                await client.reconnect()
+                self.stats["reconnects"] += 1
+                print(f"[supervisor] Reconnected to '{server_name}'")
+                return
+            except Exception as e:
+                print(f"[supervisor] Reconnecting to '{server_name}' failed: {e}")
+
+        state = self.restart_state.setdefault(server_name, {"attempts": 0, "recovered_at": 0.0})
+        if time.monotonic() - state["recovered_at"] > self.stable_after:
+            state["attempts"] = 0
+        while client.attached or \
+                (client.server_config.get('restart', True) and state["attempts"] < self.max_restarts):
+            delay = min(self.restart_initial_delay * 2 ** min(state["attempts"], 30), self.restart_max_delay)
+            state["attempts"] += 1
+            if client.attached:
+                print(f"[supervisor] Reconnecting to '{server_name}' in {delay:.1f}s (attempt {state['attempts']})")
+            else:
+                print(f"[supervisor] Restarting '{server_name}' in {delay:.1f}s "
+                      f"(attempt {state['attempts']}/{self.max_restarts})")
+            await asyncio.sleep(delay)
+            try:
+                await client.restart()
+            except Exception as e:
+                print(f"[supervisor] {'Reconnecting to' if client.attached else 'Restarting'} '{server_name}' failed: {e}")
+                continue
+            state["recovered_at"] = time.monotonic()
+            self.stats["restarts"] += 1
+            self.host.register_server_tools(server_name)
+            print(f"[supervisor] '{server_name}' is back with {len(client.tools)} tools")
+            return
+
+        self.stats["gave_up"] += 1
+        print(f"[supervisor] Giving up on '{server_name}', removing its tools")
+        self.host.unregister_server_tools(server_name)
+        self.host.mcp_clients.pop(server_name, None)
+        await client.stop_server()
+
+    async def wait_until_healthy(self, server_name: str, timeout: Optional[float] = None) -> bool:
+        """Wait for a server to be connected again; False if it was given up on or the wait timed out"""
+        deadline = time.monotonic() + (self.retry_timeout if timeout is None else timeout)
+        self.notify()
+        while time.monotonic() < deadline and self.running:
+            # Give the closing session a moment to be noticed before trusting it
+            await asyncio.sleep(0.1)
+            client = self.host.mcp_clients.get(server_name)
+            if client is None:
+                return False
+            if server_name not in self._recovering and client.connection_problem() is None:
+                return True
+        return False
@@ -71,9 +71,16 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run MCP SSE-based server')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8081, help='Port to listen on')
+    parser.add_argument('--fd', type=int, default=None, help='Listening socket inherited from the host, instead of --host/--port')
+    parser.add_argument('--transport', choices=['sse', 'stdio'], default='sse', help='Serve over SSE, or over stdin/stdout for a host using the stdio transport')
     args = parser.parse_args()
 
     # Bind SSE request handling to MCP server
     starlette_app = create_starlette_app(mcp_server, debug=True)
 
-    uvicorn.run(starlette_app, host=args.host, port=args.port)
+    if args.transport == 'stdio':
+        xMCP.run(transport='stdio')
+    elif args.fd is not None:
+        uvicorn.run(starlette_app, fd=args.fd)
+    else:
+        uvicorn.run(starlette_app, host=args.host, port=args.port)
@@ -0,0 +1,155 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+
+def canonical_args(args: Dict[str, Any]) -> str:
+    """Stable text form of tool arguments, so equal calls map to the same key.
+
+    Gemini sends integers as floats (1.0), so integral floats are folded to ints.
+    """
+    def _normalize(value):
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, dict):
+            return {str(k): _normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_normalize(v) for v in value]
+        return value
+
+    return json.dumps(_normalize(args or {}), sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _result_size(result: Any) -> int:
+    """Approximate memory footprint of a tool result in bytes"""
+    if hasattr(result, "model_dump_json"):
+        return len(result.model_dump_json())
+    return len(str(result))
+
+
+class ToolResultCache:
+    """TTL + LRU cache for results of idempotent tool calls.
+
+    Caching is opt-in: a tool is only cached if its server's config.json entry
+    has a "cache" section naming it (or "*" for every tool of that server):
+
+        "readFile": {..., "cache": {"read_from_csv_file": {"ttl": 300}}}
+
+    The top-level "toolCache" section bounds memory and declares which writes
+    evict which cached reads:
+
+        "toolCache": {
+            "maxEntries": 256,
+            "maxBytes": 8000000,
+            "invalidate": {
+                "write_to_csv_file": [{"tool": "read_from_csv_file", "match": ["file_path"]}]
+            }
+        }
+
+    A rule with "match" only evicts entries whose listed arguments equal those
+    of the write; without "match" every cached result of that tool is evicted.
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 8_000_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (server, tool) -> ttl seconds
+        self.policies: Dict[Tuple[str, str], float] = {}
+        self.invalidation_rules: Dict[str, List[Dict[str, Any]]] = {}
+        # (server, tool, canonical args) -> (expires_at, size, args, result), oldest first
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, int, Dict[str, Any], Any]]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+        self.tool_stats: Dict[str, Dict[str, int]] = {}
+
+    def configure(self, settings: Dict[str, Any], servers: Dict[str, Any]) -> None:
+        """Load limits, per-tool TTLs and invalidation rules from config.json"""
+        self.max_entries = int(settings.get('maxEntries', self.max_entries))
+        self.max_bytes = int(settings.get('maxBytes', self.max_bytes))
+        self.invalidation_rules = settings.get('invalidate', {})
+        self.policies = {}
+        for server_name, server_config in servers.items():
+            for tool_name, policy in server_config.get('cache', {}).items():
+                self.policies[(server_name, tool_name)] = float((policy or {}).get('ttl', 60))
+        self.clear()
+
+    def ttl_for(self, server_name: str, tool_name: str) -> Optional[float]:
+        """TTL for a tool's results, or None if the tool is not cacheable"""
+        ttl = self.policies.get((server_name, tool_name))
+        if ttl is None:
+            ttl = self.policies.get((server_name, "*"))
+        return ttl
+
+    def _count(self, tool_name: str, stat: str) -> None:
+        self.stats[stat] += 1
+        tool_stats = self.tool_stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+        if stat in tool_stats:
+            tool_stats[stat] += 1
+
+    def _remove(self, key) -> None:
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, server_name: str, tool_name: str, args: Dict[str, Any]) -> Optional[Any]:
+        """Cached result of a call, or None on a miss or for uncacheable tools"""
+        if self.ttl_for(server_name, tool_name) is None:
+            return None
+        key = (server_name, tool_name, canonical_args(args))
+        entry = self._entries.get(key)
+        if entry is None:
+            self._count(tool_name, "misses")
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            self._count(tool_name, "expired")
+            self._count(tool_name, "misses")
+            return None
+        self._entries.move_to_end(key)
+        self._count(tool_name, "hits")
+        return entry[3]
+
+    def put(self, server_name: str, tool_name: str, args: Dict[str, Any], result: Any) -> None:
+        """Store a successful result if the tool is cacheable, evicting least recently used entries"""
+        ttl = self.ttl_for(server_name, tool_name)
+        if ttl is None or getattr(result, "isError", False):
+            return
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        key = (server_name, tool_name, canonical_args(args))
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, dict(args or {}), result)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def invalidate_for(self, tool_name: str, args: Dict[str, Any]) -> int:
+        """Evict cached reads made stale by a call to tool_name; returns how many were evicted"""
+        rules = self.invalidation_rules.get(tool_name)
+        if not rules:
+            return 0
+        normalized = json.loads(canonical_args(args))
+        evicted = 0
+        for rule in rules:
+            fields = rule.get("match", [])
+            for key, (_, _, cached_args, _) in list(self._entries.items()):
+                if key[1] != rule.get("tool"):
+                    continue
+                cached = json.loads(canonical_args(cached_args))
+                if all(cached.get(field) == normalized.get(field) for field in fields):
+                    self._remove(key)
+                    evicted += 1
+        self.stats["invalidations"] += evicted
+        return evicted
+
+    def clear(self) -> None:
+        """Drop every cached result"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def summary(self) -> Dict[str, Any]:
+        """Counters and current size, for logging and health checks"""
+        return {**self.stats, "entries": len(self._entries), "bytes": self._bytes, "tools": self.tool_stats}
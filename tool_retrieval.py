@@ -0,0 +1,108 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, Any, List, Iterable, Set
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "get", "in", "is", "it", "me",
+    "my", "of", "on", "or", "please", "the", "this", "to", "with", "what", "which", "you", "your",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, splitting snake_case, camelCase and dotted names, with plurals folded"""
+    text = re.sub(r'([a-z0-9])([A-Z])', r'\1 \2', text or "")
+    tokens = []
+    for token in re.split(r'[^A-Za-z0-9]+', text.lower()):
+        if not token or token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def declaration_text(function: Dict[str, Any]) -> str:
+    """Searchable text of a function declaration: name, description and parameter docs"""
+    parts = [function.get("name", ""), function.get("name", ""), function.get("description") or ""]
+    for name, prop in function.get("parameters", {}).get("properties", {}).items():
+        parts.append(name)
+        if isinstance(prop, dict):
+            parts.append(prop.get("description") or "")
+    return " ".join(parts)
+
+
+class ToolIndex:
+    """Offline BM25 index over tool declarations, for picking the tools relevant to a query"""
+
+    def __init__(self, functions: Iterable[Dict[str, Any]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.names: List[str] = []
+        self.term_counts: List[Counter] = []
+        self.lengths: List[int] = []
+        document_frequency: Counter = Counter()
+        for function in functions:
+            tokens = tokenize(declaration_text(function))
+            self.names.append(function["name"])
+            self.term_counts.append(Counter(tokens))
+            self.lengths.append(len(tokens))
+            document_frequency.update(set(tokens))
+        count = len(self.names)
+        self.average_length = (sum(self.lengths) / count) if count else 0.0
+        self.idf = {term: math.log(1 + (count - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query: str) -> Dict[str, float]:
+        """BM25 score of every tool for the query"""
+        query_terms = tokenize(query)
+        scores = {}
+        for name, counts, length in zip(self.names, self.term_counts, self.lengths):
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+                score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores[name] = score
+        return scores
+
+    def search(self, query: str, k: int) -> List[str]:
+        """Names of the top-k tools with a positive score, best first"""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        return [name for name, score in ranked[:k] if score > 0]
+
+
+class ToolSelection:
+    """The tools one query shows to the LLM.
+
+    Starts from the top-k tools for the query, always adds tools the chain has
+    already used, and widens to every tool once the model asks for one it
+    wasn't shown (or when nothing matched the query at all).
+    """
+
+    def __init__(self, visible: Set[str], always: Set[str] = frozenset()):
+        self.visible = set(visible)
+        self.always = set(always)
+        self.used: Set[str] = set()
+        self.full = not visible
+
+    def mark_used(self, tool_names: Iterable[str]) -> None:
+        """Record tools the chain called; widens the selection if any were hidden"""
+        tool_names = set(tool_names)
+        self.used |= tool_names
+        hidden = tool_names - self.visible - self.always
+        if hidden and not self.full:
+            print(f"Model asked for tools outside the selected set {sorted(hidden)}, offering all tools")
+            self.full = True
+
+    def widen(self) -> None:
+        """Show every tool from now on"""
+        self.full = True
+
+    def filter(self, functions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The declarations this query should send to the LLM right now"""
+        if self.full:
+            return functions
+        shown = self.visible | self.used | self.always
+        return [function for function in functions if function["name"] in shown]
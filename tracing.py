@@ -0,0 +1,216 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed phase of a query; spans opened inside it become its children"""
+
+    __slots__ = ("name", "attrs", "trace", "parent", "span_id", "lane", "start_ns", "end_ns", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any], trace: "Trace", parent: Optional["Span"], lane: int):
+        self.name = name
+        self.attrs = attrs
+        self.trace = trace
+        self.parent = parent
+        self.span_id = next(trace.span_ids)
+        self.lane = lane
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set(self, **attrs) -> None:
+        """Attach more attributes, e.g. results only known at the end"""
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end_ns = time.perf_counter_ns()
+        if exc is not None:
+            self.attrs["error"] = str(exc) or exc_type.__name__
+        _current_span.reset(self._token)
+        self.trace.spans.append(self)
+        if self.parent is None:
+            self.trace.tracer._finish(self.trace)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace": self.trace.trace_id,
+            "span": self.span_id,
+            "parent": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_ms": (self.start_ns - self.trace.tracer.epoch_ns) / 1e6,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+        }
+
+
+class Trace:
+    """All spans under one root span (one query)"""
+
+    def __init__(self, tracer: "Tracer", trace_id: int):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_ids = itertools.count(1)
+        self.spans: List[Span] = []
+
+
+class _NullSpan:
+    """Stand-in returned while tracing is disabled, so instrumented code pays almost nothing.
+
+    Has the same attributes as Span, so code reading them works either way.
+    """
+
+    __slots__ = ()
+
+    name = ""
+    attrs: Dict[str, Any] = {}
+    trace = None
+    parent = None
+    span_id = 0
+    lane = 0
+    start_ns = 0
+    end_ns = 0
+    duration_ms = 0.0
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects nested spans per query and exports them.
+
+    Use tracer.span(name, **attrs) as a context manager around any phase; a
+    span opened when no span is active starts a new trace. Spans follow the
+    asyncio context, so calls run with asyncio.gather nest under the span that
+    started them. Configured from the "tracing" section of config.json:
+
+        "tracing": {"enabled": true, "export": "traces.jsonl", "format": "jsonl", "printSummary": true}
+
+    format is "jsonl" (one span per line) or "chrome" (trace-event format for
+    chrome://tracing or Perfetto).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.export_path: Optional[str] = None
+        self.export_format = "jsonl"
+        self.print_summary = True
+        self.epoch_ns = time.perf_counter_ns()
+        self.recent: deque = deque(maxlen=100)
+        self._trace_ids = itertools.count(1)
+        self._lanes: Dict[int, int] = {}
+
+    def configure(self, settings: Dict[str, Any]) -> None:
+        """Load the tracing settings from config.json"""
+        self.enabled = bool(settings.get('enabled', False))
+        self.export_path = settings.get('export')
+        self.export_format = settings.get('format', 'jsonl')
+        self.print_summary = bool(settings.get('printSummary', True))
+
+    def _lane(self) -> int:
+        """Small id of the current asyncio task, so concurrent spans land on separate rows"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        return self._lanes.setdefault(id(task), len(self._lanes) + 1)
+
+    def span(self, name: str, **attrs):
+        """Open a span under the current one (or a new trace if there is none)"""
+        if not self.enabled:
+            return NULL_SPAN
+        parent = _current_span.get()
+        trace = parent.trace if parent else Trace(self, next(self._trace_ids))
+        return Span(name, attrs, trace, parent, self._lane())
+
+    def _finish(self, trace: Trace) -> None:
+        self.recent.append(trace)
+        if len(self._lanes) > 10000:
+            self._lanes.clear()
+        if self.export_path:
+            try:
+                self.export(trace, self.export_path, self.export_format)
+            except OSError as e:
+                print(f"Error exporting trace: {e}")
+
+    def export(self, trace: Trace, path: str, export_format: str = "jsonl") -> None:
+        """Append a finished trace to a JSON lines or Chrome trace-event file"""
+        if export_format == "chrome":
+            # The JSON array format may be left unterminated, which lets us append
+            new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+            with open(path, 'a') as f:
+                if new_file:
+                    f.write("[\n")
+                for span in trace.spans:
+                    f.write(json.dumps({
+                        "name": span.name,
+                        "cat": span.name.split(".")[0],
+                        "ph": "X",
+                        "ts": (span.start_ns - self.epoch_ns) / 1e3,
+                        "dur": (span.end_ns - span.start_ns) / 1e3,
+                        "pid": os.getpid(),
+                        "tid": span.lane,
+                        "args": {"trace": trace.trace_id, **span.attrs},
+                    }, default=str) + ",\n")
+        else:
+            with open(path, 'a') as f:
+                for span in trace.spans:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    @staticmethod
+    def breakdown(trace: Trace) -> List[Dict[str, Any]]:
+        """Total and self time per span name (plus server/tool), slowest first"""
+        child_ns: Dict[int, int] = {}
+        for span in trace.spans:
+            if span.parent is not None:
+                child_ns[span.parent.span_id] = child_ns.get(span.parent.span_id, 0) + span.end_ns - span.start_ns
+        rows: Dict[str, Dict[str, Any]] = {}
+        for span in trace.spans:
+            label = span.name
+            target = span.attrs.get("tool") or span.attrs.get("server")
+            if target:
+                label = f"{label} [{target}]"
+            row = rows.setdefault(label, {"span": label, "count": 0, "total_ms": 0.0, "self_ms": 0.0})
+            total_ns = span.end_ns - span.start_ns
+            row["count"] += 1
+            row["total_ms"] += total_ns / 1e6
+            # Children may run in parallel, so self time can't go below zero
+            row["self_ms"] += max(total_ns - child_ns.get(span.span_id, 0), 0) / 1e6
+        return sorted(rows.values(), key=lambda row: row["total_ms"], reverse=True)
+
+    def format_summary(self, trace: Trace) -> str:
+        """Per-query latency breakdown as a text table"""
+        rows = self.breakdown(trace)
+        width = max([len("span")] + [len(row["span"]) for row in rows])
+        lines = [f"{'span'.ljust(width)}  {'count':>5}  {'total ms':>10}  {'self ms':>10}"]
+        for row in rows:
+            lines.append(f"{row['span'].ljust(width)}  {row['count']:>5}  {row['total_ms']:>10.1f}  {row['self_ms']:>10.1f}")
+        return "\n".join(lines)
+
+
+tracer = Tracer()
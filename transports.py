@@ -0,0 +1,122 @@
+import asyncio
+import importlib
+import importlib.util
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+import anyio
+import mcp.types as types
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.memory import create_client_server_memory_streams
+from mcp.shared.message import SessionMessage
+
+# Transports an MCPClient can talk to its server over (the "transport" setting of a server entry)
+TRANSPORTS = ("sse", "stdio", "inprocess")
+
+
+@asynccontextmanager
+async def stdio_streams(process: asyncio.subprocess.Process,
+                        on_output: Optional[Callable[[str], None]] = None):
+    """MCP read/write streams over the stdin/stdout of a server process the host spawned.
+
+    Unlike mcp's stdio_client the process stays ours (so it is watched,
+    restarted and stopped like any other server), and stdout lines that are
+    not JSON-RPC, such as a stray print() in a tool, are passed to on_output
+    instead of breaking the session.
+    """
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+
+    async def stdout_reader():
+        async with read_stream_writer:
+            while True:
+                try:
+                    data = await process.stdout.readline()
+                except ValueError:
+                    # Longer than the stream limit; not a message we could have parsed either
+                    continue
+                if not data:
+                    break
+                line = data.decode(errors='replace').strip()
+                if not line:
+                    continue
+                try:
+                    message = types.JSONRPCMessage.model_validate_json(line)
+                except ValueError:
+                    if on_output:
+                        on_output(line)
+                    continue
+                await read_stream_writer.send(SessionMessage(message))
+
+    async def stdin_writer():
+        async with write_stream_reader:
+            async for session_message in write_stream_reader:
+                data = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                process.stdin.write(data.encode() + b"\n")
+                await process.stdin.drain()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(stdout_reader)
+        tg.start_soon(stdin_writer)
+        try:
+            yield read_stream, write_stream
+        finally:
+            tg.cancel_scope.cancel()
+            await read_stream.aclose()
+            await write_stream.aclose()
+
+
+@asynccontextmanager
+async def inprocess_streams(server: FastMCP):
+    """MCP read/write streams to a FastMCP server running on the host's own event loop"""
+    lowlevel_server = server._mcp_server  # noqa: WPS437
+    async with create_client_server_memory_streams() as (client_streams, server_streams):
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(lambda: lowlevel_server.run(
+                server_streams[0], server_streams[1],
+                lowlevel_server.create_initialization_options(),
+                raise_exceptions=False,
+            ))
+            try:
+                yield client_streams
+            finally:
+                tg.cancel_scope.cancel()
+
+
+def load_inprocess_server(module: str, attribute: Optional[str] = None) -> FastMCP:
+    """Import a server module (a .py path or a dotted module name) and return its FastMCP instance.
+
+    The module runs inside the host with the host's privileges, so only
+    trusted servers should be loaded this way. Without attribute the
+    module's only FastMCP instance is used.
+    """
+    if module.endswith(".py"):
+        path = os.path.abspath(module)
+        module_name = "mcp_inprocess_" + "".join(c if c.isalnum() else "_" for c in os.path.relpath(path))
+        loaded = sys.modules.get(module_name)
+        if loaded is None:
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            if spec is None or spec.loader is None:
+                raise ImportError(f"Cannot load server module {module}")
+            loaded = importlib.util.module_from_spec(spec)
+            # The server's own imports resolve relative to its directory, as when run as a script
+            sys.path.insert(0, os.path.dirname(path))
+            try:
+                spec.loader.exec_module(loaded)
+            finally:
+                sys.path.remove(os.path.dirname(path))
+            sys.modules[module_name] = loaded
+    else:
+        loaded = importlib.import_module(module)
+
+    if attribute:
+        server = getattr(loaded, attribute, None)
+        if not isinstance(server, FastMCP):
+            raise TypeError(f"{module}:{attribute} is not a FastMCP server")
+        return server
+    servers = [value for value in vars(loaded).values() if isinstance(value, FastMCP)]
+    if len(servers) != 1:
+        raise TypeError(f"{module} defines {len(servers)} FastMCP servers, name one with \"object\"")
+    return servers[0]